@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -59,6 +60,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
+    'drive.middleware.PermissionCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -181,10 +183,66 @@ CELERY_TASK_ALWAYS_EAGER = True
 CELERY_TASK_EAGER_PROPAGATES = True
 CELERY_TASK_STORE_EAGER_RESULT = True
 
+CELERY_BEAT_SCHEDULE = {
+    "purge-expired-zips": {
+        "task": "drive.core.tasks.purge_expired_zips_task",
+        "schedule": crontab(minute=0),
+    },
+    "purge-trash": {
+        "task": "drive.core.tasks.purge_trash_task",
+        "schedule": crontab(minute=30, hour=3),
+    },
+    "verify-pending-uploads": {
+        "task": "drive.core.tasks.verify_pending_uploads_task",
+        "schedule": crontab(minute=15),
+    },
+}
+
 CELERY_TASK_ROUTES = {
     "vectorise.tasks.*": {"queue": "django"},
 }
 
+#################### DRIVE SETTINGS ############################
+
+# folder downloads: blobs fetched ahead of the zip writer, and the memory they may hold
+DRIVE_ZIP_PREFETCH_WORKERS = int(os.getenv("DRIVE_ZIP_PREFETCH_WORKERS", 8))
+DRIVE_ZIP_PREFETCH_BUFFER_BYTES = int(os.getenv("DRIVE_ZIP_PREFETCH_BUFFER_BYTES", 256 * 1024 * 1024))
+# folders up to this size can also be streamed as a zip straight to the client
+DRIVE_ZIP_STREAM_MAX_BYTES = int(os.getenv("DRIVE_ZIP_STREAM_MAX_BYTES", 512 * 1024 * 1024))
+# how long concurrent downloads of one folder keep joining the same zip job (covers task retries)
+DRIVE_ZIP_INFLIGHT_TTL = int(os.getenv("DRIVE_ZIP_INFLIGHT_TTL", 60 * 60))
+
+# zip uploads: size of each staged block and how many are staged in parallel
+DRIVE_UPLOAD_BLOCK_SIZE = int(os.getenv("DRIVE_UPLOAD_BLOCK_SIZE", 8 * 1024 * 1024))
+DRIVE_UPLOAD_MAX_CONCURRENCY = int(os.getenv("DRIVE_UPLOAD_MAX_CONCURRENCY", 4))
+
+# resumable uploads: preferred block size, grown for files that would need more than 50,000 blocks
+DRIVE_RESUMABLE_BLOCK_SIZE = int(os.getenv("DRIVE_RESUMABLE_BLOCK_SIZE", 8 * 1024 * 1024))
+
+# checksum verification of uploaded blobs: size of each ranged read and how many run in parallel
+DRIVE_VERIFY_CHUNK_SIZE = int(os.getenv("DRIVE_VERIFY_CHUNK_SIZE", 4 * 1024 * 1024))
+DRIVE_VERIFY_WORKERS = int(os.getenv("DRIVE_VERIFY_WORKERS", 4))
+
+# days trashed nodes are kept before they and their blobs are deleted for good
+DRIVE_TRASH_RETENTION_DAYS = int(os.getenv("DRIVE_TRASH_RETENTION_DAYS", 30))
+
+# per user storage quota checked when uploads are announced, 0 disables it
+DRIVE_STORAGE_QUOTA_BYTES = int(os.getenv("DRIVE_STORAGE_QUOTA_BYTES", 15 * 1024 * 1024 * 1024))
+# shared secret expected in the ?code= query string of the blob events webhook, empty disables it
+DRIVE_BLOB_EVENTS_SECRET = os.getenv("DRIVE_BLOB_EVENTS_SECRET", "")
+# reuse verified blobs with the same checksum and size instead of uploading them again.
+# Off by default: whoever knows the md5 and size of a file would get a copy of it.
+DRIVE_UPLOAD_DEDUP = os.getenv("DRIVE_UPLOAD_DEDUP", "false").lower() in ("1", "true", "yes")
+# upper bound of files announced in one bulk upload intent
+DRIVE_UPLOAD_MANIFEST_MAX_FILES = int(os.getenv("DRIVE_UPLOAD_MANIFEST_MAX_FILES", 1000))
+
+# shared azure blob client: keep-alive pool sized for the zip prefetch and block staging threads
+DRIVE_BLOB_POOL_CONNECTIONS = int(os.getenv("DRIVE_BLOB_POOL_CONNECTIONS", 4))
+DRIVE_BLOB_POOL_MAXSIZE = int(os.getenv("DRIVE_BLOB_POOL_MAXSIZE", 32))
+DRIVE_BLOB_CONNECTION_TIMEOUT = int(os.getenv("DRIVE_BLOB_CONNECTION_TIMEOUT", 10))
+# parallel blob property requests when finalizing many uploads
+DRIVE_BLOB_METADATA_WORKERS = int(os.getenv("DRIVE_BLOB_METADATA_WORKERS", 16))
+
 #################### CACHE SETTINGS ############################
 
 REDIS = {
@@ -1,25 +1,43 @@
-from rest_framework.permissions import IsAuthenticated
+import hmac
+from django.conf import settings
+from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.shortcuts import get_object_or_404
 from drive.models import Node
 from drive.serializers.node_serializers import (
     NodeDetailsSerializer,
     NodeSerializer,
     NodeShareSerializer,
+    NodeTargetSerializer,
     CreateFolderNodeSerializer,
     InitUploadSerializer,
+    BulkUploadIntentSerializer,
     FinalizeFileUploadSerializer,
+    BulkFinalizeUploadSerializer,
+    ResumableUploadSerializer,
     UpdateNodeSerializer
 )
 from drive.utils.permissions import IsEditor, IsViewer, can_edit
 from drive.utils.shortcuts import get_or_create_root_folder
+from drive.utils.pagination import NodeCursorPagination
 from drive.core.services.node_manager import (
     get_top_level_shared_nodes,
     share_node_with_users,
     create_folder_node,
+    move_node,
+    copy_node,
+    trash_node,
+    restore_node,
+    get_trashed_nodes,
     download_node,
+    stream_node_zip,
     search_for_node,
     init_upload_process,
-    finalize_upload_process
+    init_bulk_upload_process,
+    finalize_upload_process,
+    finalize_bulk_upload_process,
+    plan_resumable_upload,
+    get_missing_blocks,
+    commit_resumable_upload
 )
 from rest_framework.response import Response
 from django.core.exceptions import BadRequest
@@ -27,9 +45,16 @@ from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.generics import UpdateAPIView
+from rest_framework.pagination import PageNumberPagination
 from django.core.exceptions import PermissionDenied
 from celery.result import AsyncResult
-from drive.core.services.redis_cache import redis_client, TASK_OWNER_KEY
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from drive.core.services.redis_cache import is_task_owner
+from drive.core.services.blob_events import get_validation_code, get_created_blob_keys
+from drive.core.tasks import finalize_uploads_task
+
+FINALIZE_EVENTS_BATCH_SIZE = 500
 
 
 class NodeViewSet(viewsets.ModelViewSet):
@@ -40,6 +65,15 @@ class NodeViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthenticated, IsViewer]
         return [permission() for permission in permission_classes]
     
+    @property
+    def paginator(self):
+        """
+        `?pagination=cursor` switches folder listings to keyset pagination.
+        """
+        if not hasattr(self, "_paginator") and self.request.query_params.get("pagination") == "cursor":
+            self._paginator = NodeCursorPagination()
+        return super().paginator
+
     def get_object(self, use_select_related=True):
         queryset = Node.active_objects
         if use_select_related:
@@ -73,7 +107,7 @@ class NodeViewSet(viewsets.ModelViewSet):
         qs = self.get_queryset()
         page = self.paginate_queryset(qs)
         if page is not None:
-            serializer = NodeSerializer(qs, many=True)
+            serializer = NodeSerializer(page, many=True)
             return self.get_paginated_response(serializer.data)
         serializer = NodeSerializer(qs, many=True)
         return Response(serializer.data)
@@ -82,6 +116,10 @@ class NodeViewSet(viewsets.ModelViewSet):
     def shared(self, request):
         """GET /nodes/shared/ name=node-shared"""
         nodes = get_top_level_shared_nodes(request.user)
+        page = self.paginate_queryset(nodes)
+        if page is not None:
+            serializer = NodeSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
         serializer = NodeSerializer(nodes, many=True)
         return Response(serializer.data)
     
@@ -97,6 +135,52 @@ class NodeViewSet(viewsets.ModelViewSet):
             serializer.validated_data["access_level"]
         )
         return Response(status=201)
+
+    @action(detail=False, methods=['get'])
+    def trash(self, request):
+        """GET /nodes/trash/ name=node-trash"""
+        nodes = get_trashed_nodes(request.user)
+        page = self.paginate_queryset(nodes)
+        if page is not None:
+            serializer = NodeSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = NodeSerializer(nodes, many=True)
+        return Response(serializer.data)
+
+    def destroy(self, request, pk=None):
+        """DELETE /nodes/{id}/ moves the node to the trash"""
+        trash_node(user=request.user, node_id=pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def restore(self, request, pk=None):
+        """POST /nodes/{id}/restore/ name=node-restore"""
+        node = restore_node(user=request.user, node_id=pk)
+        return Response(NodeSerializer(node).data)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def move(self, request, pk=None):
+        """POST /nodes/{id}/move/ name=node-move"""
+        serializer = NodeTargetSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        node = move_node(
+            user=request.user,
+            node_id=pk,
+            target_id=serializer.validated_data["target_id"]
+        )
+        return Response(NodeSerializer(node).data)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def copy(self, request, pk=None):
+        """POST /nodes/{id}/copy/ name=node-copy"""
+        serializer = NodeTargetSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        node = copy_node(
+            user=request.user,
+            node_id=pk,
+            target_id=serializer.validated_data["target_id"]
+        )
+        return Response(NodeSerializer(node).data, status=201)
     
     def create(self, request):
         serializer = CreateFolderNodeSerializer(data=request.data)
@@ -113,13 +197,26 @@ class DownloadNodeView(APIView):
     def get(self, request, node_id):
         result = download_node(request.user, node_id)
         return Response(data=result, status=status.HTTP_202_ACCEPTED)
+
+
+class StreamNodeZipView(APIView):
+    def get(self, request, node_id):
+        filename, chunks = stream_node_zip(request.user, node_id)
+        return StreamingHttpResponse(
+            chunks,
+            content_type="application/zip",
+            headers={"Content-Disposition": content_disposition_header(True, filename)}
+        )
     
 
 class SearchUserNode(APIView):
     def get(self, request):
         query_text = request.GET.get("q", "")
         result = search_for_node(request.user, query_text)
-        return Response(data=result, status=status.HTTP_200_OK)
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(result, request, view=self)
+        serializer = NodeDetailsSerializer(page, many=True, context={"user": request.user})
+        return paginator.get_paginated_response(serializer.data)
     
 
 class InitFileUpload(APIView):
@@ -137,6 +234,18 @@ class InitFileUpload(APIView):
         return Response(data=res, status=200)
     
 
+class BulkInitFileUpload(APIView):
+    def post(self, request):
+        serializer = BulkUploadIntentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        res = init_bulk_upload_process(
+            user=request.user,
+            parent_id=serializer.validated_data["parent_id"],
+            files=serializer.validated_data["files"]
+        )
+        return Response(data=res, status=200)
+    
+
 class FinalizeFileUpload(APIView):
     def post(self, request, node_id):
         serializer = FinalizeFileUploadSerializer(data=request.data)
@@ -149,6 +258,75 @@ class FinalizeFileUpload(APIView):
         return Response(data=res, status=201)
     
 
+class ResumableUploadView(APIView):
+    """
+    Block by block upload of a file announced with an upload intent:
+    GET lists the blocks still missing, POST plans the blocks (``action``
+    "plan") or commits them once all are staged (``action`` "commit").
+    """
+    def get(self, request, node_id):
+        serializer = FinalizeFileUploadSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        res = get_missing_blocks(
+            user=request.user,
+            node_id=node_id,
+            version_id=serializer.validated_data["version_id"]
+        )
+        return Response(data=res, status=200)
+
+    def post(self, request, node_id):
+        serializer = ResumableUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if serializer.validated_data["action"] == "plan":
+            res = plan_resumable_upload(
+                user=request.user,
+                node_id=node_id,
+                version_id=serializer.validated_data["version_id"]
+            )
+            return Response(data=res, status=200)
+        res = commit_resumable_upload(
+            user=request.user,
+            node_id=node_id,
+            version_id=serializer.validated_data["version_id"]
+        )
+        return Response(data=res, status=201)
+    
+
+class BulkFinalizeFileUpload(APIView):
+    def post(self, request):
+        serializer = BulkFinalizeUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        res = finalize_bulk_upload_process(
+            user=request.user,
+            version_ids=serializer.validated_data["version_ids"]
+        )
+        return Response(data=res, status=200)
+    
+
+class BlobEventsWebhook(APIView):
+    """
+    Event Grid webhook for blob-created events of the files container: uploads
+    are finalized by a worker without waiting for the client.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        secret = settings.DRIVE_BLOB_EVENTS_SECRET
+        if not secret or not hmac.compare_digest(request.query_params.get("code", ""), secret):
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        events = request.data if isinstance(request.data, list) else [request.data]
+
+        validation_code = get_validation_code(events)
+        if validation_code is not None:
+            return Response(data={"validationResponse": validation_code})
+
+        storage_keys = get_created_blob_keys(events)
+        for start in range(0, len(storage_keys), FINALIZE_EVENTS_BATCH_SIZE):
+            finalize_uploads_task.delay(storage_keys[start:start + FINALIZE_EVENTS_BATCH_SIZE])
+        return Response(status=status.HTTP_200_OK)
+    
+
 class UpdateNode(UpdateAPIView):
     serializer_class = UpdateNodeSerializer
     queryset = Node.active_objects.all()
@@ -162,14 +340,8 @@ class UpdateNode(UpdateAPIView):
 
 class TaskResultView(APIView):
     def get(self, request, task_id):
-        user_id = request.user.id
-        owner = redis_client.hget(TASK_OWNER_KEY, task_id)
-        
-        if owner is None:
-            return Response(status=404)
-        
-        if str(owner.decode() if isinstance(owner, bytes) else owner) != str(user_id):
-            return Response(status=status.HTTP_403_FORBIDDEN)
+        if not is_task_owner(task_id, request.user.id):
+            return Response(status=status.HTTP_404_NOT_FOUND)
             
         async_res = AsyncResult(task_id)
         
@@ -1,74 +1,199 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from azure.storage.blob import (
     BlobServiceClient,
     generate_blob_sas,
     BlobSasPermissions,
     BlobBlock,
+    ContentSettings,
 )
+import hashlib
 import io
-import uuid
+import os
+import queue
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from azure.core.pipeline.transport import RequestsTransport
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
 from azure.identity import DefaultAzureCredential
 from urllib.parse import quote
 
-def get_blob_service():
+_blob_service = None
+_blob_service_pid = None
+_blob_service_lock = threading.Lock()
+
+
+def _build_transport():
+    # retries are left to the azure pipeline, the adapter only pools connections
+    adapter = HTTPAdapter(
+        pool_connections=settings.DRIVE_BLOB_POOL_CONNECTIONS,
+        pool_maxsize=settings.DRIVE_BLOB_POOL_MAXSIZE,
+        max_retries=Retry(total=False, redirect=False, raise_on_status=False),
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return RequestsTransport(
+        session=session,
+        session_owner=False,
+        connection_timeout=settings.DRIVE_BLOB_CONNECTION_TIMEOUT,
+    )
+
+
+def _create_blob_service():
+    transport = _build_transport()
     if settings.USE_AZURE_IDENTITY:
-        print("we should not be here: ", settings.USE_AZURE_IDENTITY)
-        exit()
         return BlobServiceClient(
             account_url=settings.AZURE_STORAGE_BLOB_ENDPOINT,
-            credential=DefaultAzureCredential()
-        )
-    else:
-        return BlobServiceClient.from_connection_string(
-            settings.AZURE_CONNECTION_STRING
+            credential=DefaultAzureCredential(),
+            transport=transport
         )
+    return BlobServiceClient.from_connection_string(
+        settings.AZURE_CONNECTION_STRING,
+        transport=transport
+    )
+
+
+def get_blob_service():
+    """
+    Process-wide client sharing one keep-alive connection pool. A forked
+    worker (celery prefork) builds its own client instead of reusing the
+    parent's sockets.
+    """
+    global _blob_service, _blob_service_pid
+    pid = os.getpid()
+    if _blob_service_pid != pid:
+        with _blob_service_lock:
+            if _blob_service_pid != pid:
+                _blob_service = _create_blob_service()
+                _blob_service_pid = pid
+    return _blob_service
+
+
+def _reset_blob_service_after_fork():
+    global _blob_service, _blob_service_pid, _blob_service_lock
+    _blob_service = None
+    _blob_service_pid = None
+    _blob_service_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_blob_service_after_fork)
+
+SAS_LIFETIME = timedelta(hours=1)
+# delegation keys may live up to 7 days; one is requested per day and
+# renewed once it would expire before a freshly signed url
+DELEGATION_KEY_LIFETIME = timedelta(days=1)
+
+
+class SasSigner:
+    """
+    Mints blob SAS urls offline. The account name, url and key (or the user
+    delegation key in identity mode) are loaded once and kept, so signing a
+    whole page of urls is pure CPU.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._account = None
+        self._delegation_key = None
+        self._delegation_key_expiry = None
+
+    def _get_account(self):
+        if self._account is None:
+            client = get_blob_service()
+            account_key = None if settings.USE_AZURE_IDENTITY else client.credential.account_key
+            self._account = (client.account_name, client.url, account_key)
+        return self._account
+
+    def _get_delegation_key(self, now):
+        with self._lock:
+            if self._delegation_key is None or self._delegation_key_expiry <= now + SAS_LIFETIME:
+                expiry = now + DELEGATION_KEY_LIFETIME
+                self._delegation_key = get_blob_service().get_user_delegation_key(
+                    key_start_time=now - timedelta(minutes=5),
+                    key_expiry_time=expiry
+                )
+                self._delegation_key_expiry = expiry
+            return self._delegation_key
+
+    def sign_many(self, blob_refs, permissions: BlobSasPermissions, container_name: str = "files") -> dict[str, str]:
+        account_name, account_url, account_key = self._get_account()
+        now = datetime.now(timezone.utc)
+        expiry = now + SAS_LIFETIME
+        if settings.USE_AZURE_IDENTITY:
+            credential = {"user_delegation_key": self._get_delegation_key(now)}
+        else:
+            credential = {"account_key": account_key}
+
+        urls = {}
+        for blob_ref in blob_refs:
+            sas_token = generate_blob_sas(
+                account_name=account_name,
+                container_name=container_name,
+                blob_name=blob_ref,
+                permission=permissions,
+                expiry=expiry,
+                **credential
+            )
+            urls[blob_ref] = f"{account_url}{container_name}/{quote(blob_ref)}?{sas_token}"
+        return urls
+
+    def sign(self, blob_ref: str, permissions: BlobSasPermissions, container_name: str = "files") -> str:
+        return self.sign_many([blob_ref], permissions, container_name)[blob_ref]
+
+
+_sas_signer = SasSigner()
+
+
+def _reset_sas_signer_after_fork():
+    global _sas_signer
+    _sas_signer = SasSigner()
+
+
+os.register_at_fork(after_in_child=_reset_sas_signer_after_fork)
+
+
+def get_sas_signer() -> SasSigner:
+    return _sas_signer
+
 
 def generate_upload_sas(blob_ref:str, container_name:str = "files"):
     permissions = BlobSasPermissions(write=True, create=True)
     return generate_sas(blob_ref, permissions, container_name)
 
+def get_upload_sas_expiry():
+    """
+    Until when an upload url signed now can write, with a margin for clock
+    skew between us and the storage service.
+    """
+    return datetime.now(timezone.utc) + SAS_LIFETIME + timedelta(minutes=5)
+
 def generate_download_sas(blob_ref:str, container_name:str = "files"):
     permissions = BlobSasPermissions(read=True)
     return generate_sas(blob_ref, permissions, container_name)
 
-def generate_sas(blob_ref: str, permissions: BlobSasPermissions, content_disposition:str, container_name:str = "files"):
-    client = get_blob_service()
-    start = datetime.now()
-    expiry = start + timedelta(hours=1)
+def generate_upload_sas_many(blob_refs, container_name:str = "files") -> dict[str, str]:
+    permissions = BlobSasPermissions(write=True, create=True)
+    return get_sas_signer().sign_many(blob_refs, permissions, container_name)
 
-    if settings.USE_AZURE_IDENTITY:
-        exit()
-        user_delegation_key = client.get_user_delegation_key(
-            key_start_time=start,
-            key_expiry_time=expiry
-        )
-        sas_token = generate_blob_sas(
-            account_name=settings.AZURE_STORAGE_ACCOUNT_NAME,
-            container_name=container_name,
-            blob_name=blob_ref,
-            user_delegation_key=user_delegation_key,
-            permission=permissions,
-            expiry=expiry
-        )
-    else:
-        sas_token = generate_blob_sas(
-            account_name=client.account_name,
-            container_name=container_name,
-            blob_name=blob_ref,
-            account_key=client.credential.account_key,
-            permission=permissions,
-            expiry=expiry
-        )
-    safe_blob_ref = quote(blob_ref)
-    return f"{client.url}{container_name}/{safe_blob_ref}?{sas_token}"
+def generate_download_sas_many(blob_refs, container_name:str = "files") -> dict[str, str]:
+    permissions = BlobSasPermissions(read=True)
+    return get_sas_signer().sign_many(blob_refs, permissions, container_name)
+
+def generate_sas(blob_ref: str, permissions: BlobSasPermissions, container_name:str = "files"):
+    return get_sas_signer().sign(blob_ref, permissions, container_name)
 
     
 def get_file_metadata(storage_key:str, container_name:str = 'files'):
     blob_client = get_blob_service().get_blob_client(container=container_name, blob=storage_key)
-    if not blob_client.exists():
+    try:
+        props = blob_client.get_blob_properties()
+    except ResourceNotFoundError:
         return {"status": False, "message": "file not found"}
-    props = blob_client.get_blob_properties()
     return {
         "status": True,
         "size": props.size,
@@ -77,41 +202,173 @@ def get_file_metadata(storage_key:str, container_name:str = 'files'):
         "last_modified": props.last_modified
     }
 
+def get_files_metadata(storage_keys, container_name:str = 'files', max_workers=None) -> dict[str, dict]:
+    """
+    ``get_file_metadata`` for many blobs, one properties request each, run
+    side by side over the shared connection pool.
+    """
+    storage_keys = list(storage_keys)
+    if not storage_keys:
+        return {}
+    max_workers = min(max_workers or settings.DRIVE_BLOB_METADATA_WORKERS, len(storage_keys))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="blob-metadata") as pool:
+        metadata = pool.map(lambda key: get_file_metadata(key, container_name), storage_keys)
+        return dict(zip(storage_keys, metadata))
+
+def get_uncommitted_block_ids(storage_key:str, container_name:str = 'files') -> list[str]:
+    blob_client = get_blob_service().get_blob_client(container=container_name, blob=storage_key)
+    try:
+        _, uncommitted = blob_client.get_block_list(block_list_type="uncommitted")
+    except ResourceNotFoundError:
+        return []
+    return [block.id for block in uncommitted]
+
+def commit_blocks(storage_key:str, block_ids, content_type:str, container_name:str = 'files'):
+    blob_client = get_blob_service().get_blob_client(container=container_name, blob=storage_key)
+    blob_client.commit_block_list(
+        [BlobBlock(block_id=block_id) for block_id in block_ids],
+        content_settings=ContentSettings(content_type=content_type)
+    )
+
+def start_blob_copy(source_key:str, target_key:str, container_name:str = 'files') -> bool:
+    """
+    Starts a server side copy of a blob under a new name (Copy Blob, any
+    size). Later writes to the source do not reach the copy. Returns True
+    when the copy is already done, as it usually is inside one account.
+    """
+    blob_client = get_blob_service().get_blob_client(container=container_name, blob=target_key)
+    copy = blob_client.start_copy_from_url(generate_download_sas(source_key, container_name))
+    return copy["copy_status"] == "success"
+
+def hash_blob(storage_key:str, container_name:str = 'files', chunk_size=None, max_workers=None):
+    """
+    ``(md5, blake2b)`` hex digests of a blob, or None when it does not exist.
+    Ranges are downloaded ahead by a thread pool and fed to the hashes in
+    order; the etag pins the reads to the version whose size was read.
+    """
+    chunk_size = chunk_size or settings.DRIVE_VERIFY_CHUNK_SIZE
+    max_workers = max_workers or settings.DRIVE_VERIFY_WORKERS
+    blob_client = get_blob_service().get_blob_client(container=container_name, blob=storage_key)
+    try:
+        props = blob_client.get_blob_properties()
+    except ResourceNotFoundError:
+        return None
+
+    def read_range(offset):
+        return blob_client.download_blob(
+            offset=offset,
+            length=min(chunk_size, props.size - offset),
+            etag=props.etag,
+            match_condition=MatchConditions.IfNotModified
+        ).readall()
+
+    md5 = hashlib.md5()
+    blake = hashlib.blake2b(digest_size=32)
+    offsets = iter(range(0, props.size, chunk_size))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="blob-hash") as pool:
+        pending = deque()
+        try:
+            for offset in offsets:
+                pending.append(pool.submit(read_range, offset))
+                if len(pending) >= max_workers * 2:
+                    break
+            while pending:
+                chunk = pending.popleft().result()
+                offset = next(offsets, None)
+                if offset is not None:
+                    pending.append(pool.submit(read_range, offset))
+                md5.update(chunk)
+                blake.update(chunk)
+        finally:
+            for future in pending:
+                future.cancel()
+    return md5.hexdigest(), blake.hexdigest()
+
 class AzureBlockStreamer(io.RawIOBase):
-    def __init__(self, blob_client, chunk_size=4 * 1024 * 1024):
+    """
+    Write-only stream that uploads to a block blob as it is written.
+
+    Data is copied into a small pool of pre-allocated buffers; each full buffer is
+    staged by a worker thread while the writer fills the next one. When every
+    buffer is in flight ``write`` blocks, which keeps memory bounded to
+    ``(max_concurrency + 1) * block_size``.
+    """
+    def __init__(self, blob_client, block_size=None, max_concurrency=None):
         self.blob_client = blob_client
-        self.chunk_size = chunk_size
-        self.buffer = io.BytesIO()
+        self.block_size = block_size or settings.DRIVE_UPLOAD_BLOCK_SIZE
+        self.max_concurrency = max_concurrency or settings.DRIVE_UPLOAD_MAX_CONCURRENCY
         self.block_ids = []
         self._absolute_position = 0
+        self._free_buffers = queue.Queue()
+        for _ in range(self.max_concurrency + 1):
+            self._free_buffers.put(bytearray(self.block_size))
+        self._buffer = self._free_buffers.get()
+        self._filled = 0
+        self._futures = []
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="block-stage"
+        )
+
+    def writable(self):
+        return True
 
     def write(self, b):
-        self.buffer.write(b)
-        self._absolute_position += len(b)
-        
-        if self.buffer.tell() >= self.chunk_size:
-            self.flush_to_azure()
-        return len(b)
+        view = memoryview(b).cast("B")
+        written = len(view)
+        while view:
+            n = min(len(view), self.block_size - self._filled)
+            self._buffer[self._filled:self._filled + n] = view[:n]
+            self._filled += n
+            view = view[n:]
+            if self._filled == self.block_size:
+                self.flush_to_azure()
+        self._absolute_position += written
+        return written
 
     def tell(self):
         return self._absolute_position
 
+    def _stage_block(self, block_id, buffer, length):
+        try:
+            self.blob_client.stage_block(
+                block_id=block_id, data=memoryview(buffer)[:length], length=length
+            )
+        finally:
+            self._free_buffers.put(buffer)
+
+    def _raise_failed(self):
+        for future in self._futures:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+
     def flush_to_azure(self):
-        self.buffer.seek(0)
-        data = self.buffer.read()
-        if not data:
+        if not self._filled:
             return
+        self._raise_failed()
 
-        block_id = uuid.uuid4().hex
-
-        self.blob_client.stage_block(block_id=block_id, data=data)
+        # ids must all have the same length; the commit order comes from block_ids
+        block_id = f"{len(self.block_ids):032d}"
         self.block_ids.append(BlobBlock(block_id=block_id))
+        self._futures.append(
+            self._executor.submit(self._stage_block, block_id, self._buffer, self._filled)
+        )
 
-        self.buffer = io.BytesIO()
+        # waits for a staged block to hand its buffer back when all of them are busy
+        self._buffer = self._free_buffers.get()
+        self._filled = 0
 
     def finalize(self):
         self.flush_to_azure()
+        try:
+            for future in self._futures:
+                future.result()
+        finally:
+            self.close()
         self.blob_client.commit_block_list(self.block_ids)
 
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        super().close()
+
     def seekable(self):
-        return False 
+        return False
@@ -0,0 +1,26 @@
+SUBSCRIPTION_VALIDATION_EVENT = "Microsoft.EventGrid.SubscriptionValidationEvent"
+BLOB_CREATED_EVENT = "Microsoft.Storage.BlobCreated"
+
+
+def get_validation_code(events):
+    """
+    Code to echo back when Event Grid validates a new webhook subscription.
+    """
+    for event in events:
+        if event.get("eventType") == SUBSCRIPTION_VALIDATION_EVENT:
+            return (event.get("data") or {}).get("validationCode")
+    return None
+
+
+def get_created_blob_keys(events, container_name="files"):
+    """
+    Storage keys of the blobs created in ``container_name``, read from the
+    event subjects (``/blobServices/default/containers/<container>/blobs/<key>``).
+    """
+    prefix = f"/blobServices/default/containers/{container_name}/blobs/"
+    keys = []
+    for event in events:
+        subject = event.get("subject") or ""
+        if event.get("eventType") == BLOB_CREATED_EVENT and subject.startswith(prefix):
+            keys.append(subject[len(prefix):])
+    return list(dict.fromkeys(keys))
@@ -1,21 +1,52 @@
-from guardian.shortcuts import get_objects_for_user, get_users_with_perms, assign_perm
+from guardian.shortcuts import get_users_with_perms, assign_perm
+from guardian.models import UserObjectPermission
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import BadRequest
 from django.contrib.auth.models import User
 from drive.models import Node
 from django.shortcuts import get_object_or_404
 from drive.utils.shortcuts import get_or_create_root_folder
-from drive.core.services.redis_cache import redis_client, TASK_OWNER_KEY
-from django.db import transaction
-from django.db.models import F
-from drive.utils.shortcuts import get_or_create_root_folder, update_user_storage_usage
-from drive.core.tasks import generate_and_upload_zip_task
-from drive.models import Node, NodeVersion, ZipFolder
+from drive.core.services.redis_cache import (
+    redis_client,
+    ZIP_INFLIGHT_KEY,
+    acquire_lock,
+    release_lock,
+    add_task_owner,
+    UPLOAD_BLOCKS_KEY,
+)
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F, Q, Exists, OuterRef, Max, Value, Sum, Case, When
+from django.db.models.functions import Concat, Substr, Length
+from drive.utils.shortcuts import get_or_create_root_folder, update_user_storage_usage, check_storage_quota
+from drive.core.tasks import generate_and_upload_zip_task, verify_uploads_task, copy_blobs_task
+from drive.models import Node, NodeVersion, ZipFolder, NodeAccess, StoredBlob
 from django.shortcuts import get_object_or_404
 from django.core.exceptions import BadRequest, PermissionDenied
 from rest_framework.exceptions import NotFound
-from drive.utils.permissions import can_edit, can_view
-from drive.core.services.azure_blob import generate_upload_sas, get_file_metadata, generate_download_sas
+from drive.utils.permissions import can_edit, can_view, grant_node_access, get_ancestor_paths, IsAncestorPath
+from drive.core.services.azure_blob import (
+    generate_upload_sas,
+    generate_upload_sas_many,
+    get_upload_sas_expiry,
+    get_file_metadata,
+    get_files_metadata,
+    generate_download_sas,
+    get_blob_service,
+    get_uncommitted_block_ids,
+    commit_blocks,
+    start_blob_copy,
+    hash_blob,
+)
+from drive.core.services.zip_builder import iter_zip
+from azure.core.exceptions import AzureError
 import uuid
+import base64
+from urllib.parse import quote
+from collections import Counter, defaultdict, deque
+import hashlib
+from datetime import timedelta
+from django.utils import timezone
+from django.conf import settings
 from django.contrib.postgres.search import SearchQuery, SearchRank
 from drive.utils.permissions import get_accessible_path_filter
 
@@ -23,24 +54,43 @@ from drive.utils.permissions import get_accessible_path_filter
 def build_storage_key(user_id, node_id):
     return f"u/{user_id}/n/{node_id}/{uuid.uuid4().hex}"
 
+def get_shared_with_bulk(nodes) -> dict[int, dict]:
+    """
+    Users holding object permissions on each node, with their permission
+    codenames, loaded in one query for a whole page of nodes.
+    """
+    content_type = ContentType.objects.get_for_model(Node)
+    object_perms = UserObjectPermission.objects.filter(
+        content_type=content_type,
+        object_pk__in=[str(node.pk) for node in nodes]
+    ).select_related("user", "permission")
+
+    shared_with = {node.pk: {} for node in nodes}
+    for object_perm in object_perms:
+        user_perms = shared_with[int(object_perm.object_pk)].setdefault(object_perm.user, [])
+        user_perms.append(object_perm.permission.codename)
+    return shared_with
+
+
 def get_top_level_shared_nodes(user):
     """
-    Get only top-level nodes (depth=1) that are shared with user
+    Get only the top-most nodes shared with user: a shared node is dropped when
+    one of its ancestors is shared with the user too. Returns a lazy queryset
+    ordered by path so it can be paginated in the database.
     """
-    all_shared = get_objects_for_user(
-        user,
-        ['drive.view_node', 'drive.edit_node'],
-        klass=Node.active_objects,
-        any_perm=True,
-        with_superuser=False,
-        accept_global_perms=False
+    shared = NodeAccess.objects.filter(
+        user=user,
+        node__status=Node.NodeStatus.ACTIVE,
+        node__deleted_at__isnull=True
     )
-    sorted_nodes = sorted(all_shared, key=lambda x: x.path)
-    top_level = []
-    for node in sorted_nodes:
-        if not top_level or not node.path.startswith(top_level[-1].path):
-            top_level.append(node)
-    return top_level
+    shared_ancestor = shared.filter(
+        IsAncestorPath(F("node__path"), OuterRef("path"))
+    ).exclude(node=OuterRef("pk"))
+    return Node.active_objects.filter(
+        Exists(shared.filter(node=OuterRef("pk")))
+    ).exclude(
+        Exists(shared_ancestor)
+    ).order_by("path")
 
 
 def share_node_with_users(node, emails, access_level):
@@ -49,12 +99,14 @@ def share_node_with_users(node, emails, access_level):
         raise BadRequest("not all emails are presint")
     if access_level == "viewer":
         have_perm_users = get_users_with_perms(node, only_with_perms_in=["view_node"])
-        users = users.exclude(id__in=have_perm_users.values_list("id", flat=True))
-        assign_perm("fileSharing.view_node", users, node)
+        new_users = users.exclude(id__in=have_perm_users.values_list("id", flat=True))
+        assign_perm("drive.view_node", new_users, node)
+        grant_node_access(node, users, NodeAccess.AccessLevel.VIEWER)
     elif access_level == "editor":
         have_perm_users = get_users_with_perms(node, only_with_perms_in=["edit_node"])
-        users = users.difference(have_perm_users)
-        assign_perm("fileSharing.edit_node", users, node)
+        new_users = users.exclude(id__in=have_perm_users.values_list("id", flat=True))
+        assign_perm("drive.edit_node", new_users, node)
+        grant_node_access(node, users, NodeAccess.AccessLevel.EDITOR)
 
 
 def create_folder_node(user: User, parent_id, folder_name) -> Node:
@@ -73,24 +125,446 @@ def create_folder_node(user: User, parent_id, folder_name) -> Node:
     return parent_node.add_child(instance=new_folder)
 
 
+# maps the treebeard alphabet onto characters it never uses, so parked paths
+# cannot collide with real ones
+PARKED_STEP = str.maketrans(Node.alphabet, "abcdefghijklmnopqrstuvwxyz!#$&()*+-.")
 
-def download_node(user, node_id):
-    node = get_object_or_404(Node.active_objects.select_related("current_version"), pk=node_id)
-    if not node.is_public and not can_view(user, node) and not can_edit(user, node):
+
+def get_collation_ranks(names):
+    """
+    Rank of each name in the database sort order, which is what treebeard
+    compares names with when it keeps siblings sorted.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, dense_rank() OVER (ORDER BY name) FROM unnest(%s::text[]) AS names(name)",
+            [list(set(names))]
+        )
+        return dict(cursor.fetchall())
+
+
+def shift_sibling_subtrees(parent, moves):
+    """
+    Moves children of ``parent`` with their subtrees from one path to another,
+    ``moves`` being ``[(old path, new path)]``, in two set-based UPDATEs. The
+    unique path index is checked row by row, so the subtrees are parked on
+    paths outside the treebeard alphabet first.
+    """
+    if not moves:
+        return
+    old_paths, new_paths = zip(*moves)
+    parked_paths = [path[:-Node.steplen] + path[-Node.steplen:].translate(PARKED_STEP) for path in new_paths]
+    table = connection.ops.quote_name(Node._meta.db_table)
+    prefix_length = len(parent.path) + Node.steplen
+    sql = (
+        f"UPDATE {table} SET path = moves.new_path || substr({table}.path, %s) "
+        f"FROM unnest(%s::text[], %s::text[]) AS moves(old_path, new_path) "
+        f"WHERE {table}.path LIKE %s AND left({table}.path, %s) = moves.old_path"
+    )
+    with connection.cursor() as cursor:
+        for sources, targets in ((old_paths, parked_paths), (parked_paths, new_paths)):
+            cursor.execute(sql, [prefix_length + 1, list(sources), list(targets), parent.path + "%", prefix_length])
+
+
+def allocate_child_steps(parent, names):
+    """
+    Sibling steps for new children of ``parent`` (locked by the caller) where
+    treebeard's sorted inserts would put them: before the first sibling with
+    a greater name. ``names`` must already be in name order. Greater siblings
+    are shifted right just enough to make room. Returns one step per name.
+    """
+    siblings = list(
+        Node.objects.filter(path__startswith=parent.path, depth=parent.depth + 1)
+        .order_by("path").values_list("path", "name")
+    )
+    ranks = get_collation_ranks([name for _, name in siblings] + list(names)) if siblings else {}
+    pending = deque(range(len(names)))
+    steps = [None] * len(names)
+    moves = []
+    step = 0
+    for path, name in siblings:
+        while pending and ranks[names[pending[0]]] < ranks[name]:
+            step += 1
+            steps[pending.popleft()] = step
+        own_step = Node._str2int(path[-Node.steplen:])
+        step = max(step + 1, own_step)
+        if step != own_step:
+            moves.append((path, Node._get_path(parent.path, parent.depth + 1, step)))
+    for index in pending:
+        step += 1
+        steps[index] = step
+    if step > len(Node.alphabet) ** Node.steplen - 1:
+        raise BadRequest("too many entries in one folder")
+
+    shift_sibling_subtrees(parent, moves)
+    return steps
+
+
+def get_target_folder(user, target_id):
+    target = get_object_or_404(Node.active_objects, pk=target_id)
+    if not target.is_folder:
+        raise BadRequest("Invalid target id")
+    if not can_edit(user, target):
         raise PermissionDenied()
-    if node.is_folder:
-        files_info, size = get_files_info(node)
-        storage_key = build_storage_key(user.id, node.id) + "/" + node.name + ".zip"
+    return target
+
+
+def get_sorted_child_path(parent, name):
+    """
+    Path for a new child ``name`` of ``parent`` (locked by the caller) at its
+    name position, see ``allocate_child_steps``.
+    """
+    step, = allocate_child_steps(parent, [name])
+    return Node._get_path(parent.path, parent.depth + 1, step)
+
+
+def move_node(*, user, node_id, target_id):
+    """
+    Moves a node with its whole subtree under ``target_id``. Path, depth and
+    display path of the subtree are rewritten by prefix in one UPDATE.
+    """
+    node = get_object_or_404(Node.active_objects, pk=node_id)
+    if not can_edit(user, node):
+        raise PermissionDenied()
+    target = get_target_folder(user, target_id)
+
+    with transaction.atomic():
+        locked = {
+            locked_node.pk: locked_node
+            for locked_node in Node.objects.select_for_update().filter(pk__in=[node.pk, target.pk]).order_by("pk")
+        }
+        node, target = locked[node.pk], locked[target.pk]
+        if node.is_root():
+            raise BadRequest("root folders cannot be moved")
+        if target.path.startswith(node.path):
+            raise BadRequest("a folder cannot be moved into itself")
+        if node.path[:-node.steplen] == target.path:
+            return node
+
+        new_path = get_sorted_child_path(target, node.name)
+        if node.path.startswith(target.path):
+            # making room may have shifted the node itself
+            node.path = Node.objects.values_list("path", flat=True).get(pk=node.pk)
+        old_parent_path = node.path[:-node.steplen]
+        subtree = Node.objects.filter(path__startswith=node.path)
+        longest = subtree.aggregate(longest=Max(Length("path")))["longest"]
+        if longest - len(node.path) + len(new_path) > Node._meta.get_field("path").max_length:
+            raise BadRequest("folder structure is too deep")
+
+        subtree.update(
+            path=Concat(Value(new_path), Substr("path", len(node.path) + 1)),
+            depth=F("depth") + (target.depth + 1 - node.depth),
+            display_path=Concat(
+                Value(Node.join_display_path(target.display_path, node.name)),
+                Substr("display_path", len(node.display_path) + 1)
+            )
+        )
+        Node.objects.filter(path=old_parent_path).update(numchild=F("numchild") - 1)
+        Node.objects.filter(pk=target.pk).update(numchild=F("numchild") + 1)
+
+    node.refresh_from_db()
+    return node
+
+
+def get_copy_sources(node):
+    """
+    Active nodes of the subtree of ``node`` in path order, leaving out the
+    ones below a folder that is not active since a copy skips those too.
+    """
+    sources, copied_paths = [], set()
+    for source in Node.active_objects.filter(path__startswith=node.path).order_by("path").values_list(
+        "pk", "path", "name", "type", "description", "current_version_id", named=True
+    ):
+        if source.path == node.path or source.path[:-Node.steplen] in copied_paths:
+            sources.append(source)
+            copied_paths.add(source.path)
+    return sources
+
+
+def copy_node(*, user, node_id, target_id):
+    """
+    Copies a node with its active subtree under ``target_id`` using bulk
+    inserts. Copied files get one version pointing at the same stored blob,
+    so no content is copied: the blobs gain references and the user is
+    charged for the bytes. Blobs an upload url can still write to are copied
+    server side instead, so the uploader cannot change the copy: those files
+    start out UPLOADING with a blob of their own and ``copy_blobs_task``
+    copies the content once the transaction has committed.
+    """
+    node = get_object_or_404(Node.active_objects, pk=node_id)
+    if not can_view(user, node):
+        raise PermissionDenied()
+    target = get_target_folder(user, target_id)
+    if target.path.startswith(node.path):
+        raise BadRequest("a folder cannot be copied into itself")
+
+    sources = get_copy_sources(node)
+    source_versions = NodeVersion.objects.select_related("blob").in_bulk(
+        [source.current_version_id for source in sources if source.current_version_id]
+    )
+    size = sum(version.size for version in source_versions.values())
+    check_storage_quota(user, size)
+    now = timezone.now()
+    writable_versions = {
+        version.pk for version in source_versions.values()
+        if version.blob is not None and version.blob.writable_until and version.blob.writable_until > now
+    }
+    max_path_length = Node._meta.get_field("path").max_length
+
+    with transaction.atomic():
+        target = Node.objects.select_for_update().get(pk=target.pk)
+        copies = {}
+        last_steps = Counter()
+        for source in sources:
+            if source.path == node.path:
+                path = get_sorted_child_path(target, source.name)
+                depth = target.depth + 1
+                parent_display_path = target.display_path
+            else:
+                parent = copies[source.path[:-Node.steplen]]
+                last_steps[parent.path] += 1
+                parent.numchild += 1
+                depth = parent.depth + 1
+                path = Node._get_path(parent.path, depth, last_steps[parent.path])
+                parent_display_path = parent.display_path
+            if len(path) > max_path_length:
+                raise BadRequest("folder structure is too deep")
+            copies[source.path] = Node(
+                owner=user,
+                name=source.name,
+                type=source.type,
+                description=source.description,
+                status=(
+                    Node.NodeStatus.UPLOADING if source.current_version_id in writable_versions
+                    else Node.NodeStatus.ACTIVE
+                ),
+                path=path,
+                depth=depth,
+                numchild=0,
+                display_path=Node.join_display_path(parent_display_path, source.name),
+            )
+        Node.objects.bulk_create(copies.values(), batch_size=500)
+        Node.objects.filter(pk=target.pk).update(numchild=F("numchild") + 1)
+
+        copied_by_pk = {source.pk: copies[source.path] for source in sources}
+        Tagging = Node.tags.through
+        Tagging.objects.bulk_create([
+            Tagging(node_id=copied_by_pk[node_pk].pk, tag_id=tag_id)
+            for node_pk, tag_id in Tagging.objects.filter(node_id__in=copied_by_pk).values_list("node_id", "tag_id")
+        ], batch_size=500)
+
+        copied_files = [
+            (copied_by_pk[source.pk], source_versions[source.current_version_id])
+            for source in sources
+            if source.current_version_id in source_versions
+        ]
+        own_blobs = {
+            copy.pk: StoredBlob(
+                storage_key=build_storage_key(user.pk, copy.pk),
+                checksum=version.checksum,
+                size=version.size,
+                ref_count=1
+            )
+            for copy, version in copied_files if version.pk in writable_versions
+        }
+        StoredBlob.objects.bulk_create(own_blobs.values(), batch_size=500)
+
+        versions = NodeVersion.objects.bulk_create([
+            NodeVersion(
+                node=copy,
+                version_number=1,
+                storage_provider=version.storage_provider,
+                storage_key=own_blobs[copy.pk].storage_key if copy.pk in own_blobs else version.storage_key,
+                blob=own_blobs.get(copy.pk, version.blob),
+                size=version.size,
+                mime_type=version.mime_type,
+                checksum=version.checksum,
+                status=NodeVersion.FileStatus.UPLOADING if copy.pk in own_blobs else NodeVersion.FileStatus.ACTIVE,
+                integrity=NodeVersion.IntegrityStatus.PENDING if copy.pk in own_blobs else version.integrity
+            )
+            for copy, version in copied_files
+        ], batch_size=500)
+
+        shared, pending_copies = [], []
+        for (copy, source_version), version in zip(copied_files, versions):
+            if copy.pk in own_blobs:
+                pending_copies.append((version.pk, source_version.storage_key))
+            else:
+                copy.current_version = version
+                shared.append(version)
+        Node.objects.bulk_update([version.node for version in shared], ["current_version"], batch_size=500)
+        add_blob_references([version.blob_id for version in shared if version.blob_id])
+        # copied blobs are charged when their upload is finalized
+        copied_bytes = sum(version.size for version in shared)
+        if copied_bytes:
+            update_user_storage_usage(user, copied_bytes)
+        if pending_copies:
+            transaction.on_commit(lambda: copy_blobs_task.delay(pending_copies))
+
+    return copies[node.path]
+
+
+
+def get_subtree_usage(subtree):
+    """
+    Bytes of the finalized versions of the nodes in ``subtree``, per owner,
+    summed in the database.
+    """
+    return NodeVersion.active_objects.filter(
+        node__in=subtree,
+        status=NodeVersion.FileStatus.ACTIVE
+    ).values("node__owner_id").annotate(size=Sum("size")).values_list("node__owner_id", "size")
+
+
+def trash_node(*, user, node_id):
+    """
+    Moves a node and its subtree to the trash with one UPDATE: every node
+    still in the tree gets the same ``deleted_at``, the trashed node itself
+    becomes TRASHED. Their bytes are released from the owners' usage.
+    """
+    node = get_object_or_404(Node.active_objects, pk=node_id)
+    if not can_edit(user, node):
+        raise PermissionDenied()
+    if node.is_root():
+        raise BadRequest("root folders cannot be trashed")
+
+    with transaction.atomic():
+        node = get_object_or_404(Node.active_objects.select_for_update(), pk=node.pk)
+        subtree = Node.objects.filter(path__startswith=node.path, deleted_at__isnull=True)
+        usage = list(get_subtree_usage(subtree))
+        subtree.update(
+            deleted_at=timezone.now(),
+            status=Case(When(pk=node.pk, then=Value(Node.NodeStatus.TRASHED)), default=F("status"))
+        )
+        for owner_id, size in usage:
+            update_user_storage_usage(owner_id, -size)
+
+
+def restore_node(*, user, node_id):
+    """
+    Takes a trashed node out of the trash with the nodes that were trashed
+    along with it; descendants trashed on their own before stay in the trash.
+    Rejected when the restored bytes would take an owner over quota.
+    """
+    node = get_object_or_404(
+        Node.objects.filter(status=Node.NodeStatus.TRASHED, deleted_at__isnull=False), pk=node_id
+    )
+    if not can_edit(user, node):
+        raise PermissionDenied()
+    if Node.objects.filter(path__in=get_ancestor_paths(node)[:-1], deleted_at__isnull=False).exists():
+        raise BadRequest("the parent folder is in the trash")
+
+    with transaction.atomic():
+        node = get_object_or_404(
+            Node.objects.select_for_update().filter(status=Node.NodeStatus.TRASHED), pk=node.pk
+        )
+        subtree = Node.objects.filter(path__startswith=node.path, deleted_at=node.deleted_at)
+        usage = list(get_subtree_usage(subtree))
+        # the bytes count again, so every owner has to have room for them
+        for owner_id, size in usage:
+            check_storage_quota(owner_id, size)
+        subtree.update(
+            deleted_at=None,
+            status=Case(When(pk=node.pk, then=Value(Node.NodeStatus.ACTIVE)), default=F("status"))
+        )
+        for owner_id, size in usage:
+            update_user_storage_usage(owner_id, size)
+
+    node.refresh_from_db()
+    return node
+
+
+def get_trashed_nodes(user):
+    return Node.objects.filter(
+        owner=user,
+        status=Node.NodeStatus.TRASHED,
+        deleted_at__isnull=False
+    ).order_by("-deleted_at")
+
+
+
+# a cached zip is only handed out while it outlives the SAS url generated for it
+ZIP_CACHE_MIN_LIFETIME = timedelta(hours=1)
+
+
+def get_cached_zipfolder(node, fingerprint):
+    return ZipFolder.objects.filter(
+        node=node,
+        fingerprint=fingerprint,
+        status=ZipFolder.ZipFolderStatus.COMPLETED,
+        expires_at__gt=timezone.now() + ZIP_CACHE_MIN_LIFETIME
+    ).order_by("-created_at").first()
+
+
+def get_base_zipfolder(node):
+    """
+    Latest finished zip of the folder, whose unchanged entries can be copied
+    into the new archive.
+    """
+    return ZipFolder.objects.filter(
+        node=node,
+        status=ZipFolder.ZipFolderStatus.COMPLETED,
+        expires_at__gt=timezone.now() + ZIP_CACHE_MIN_LIFETIME
+    ).order_by("-created_at").only("id").first()
+
+
+def start_zip_task(user, node, files_info, size, fingerprint):
+    """
+    Single-flight zip job per (node, fingerprint): the first request takes a
+    redis lock holding a pre-generated task id and queues the job, concurrent
+    requests for the same content get the running task id back.
+    """
+    inflight_key = f"{ZIP_INFLIGHT_KEY}:{node.id}:{fingerprint}"
+    while True:
+        task_id = str(uuid.uuid4())
+        if acquire_lock(inflight_key, task_id, settings.DRIVE_ZIP_INFLIGHT_TTL):
+            break
+        running_task_id = redis_client.get(inflight_key)
+        if running_task_id is not None:
+            return running_task_id
+
+    storage_key = build_storage_key(user.id, node.id) + "/" + node.name + ".zip"
+    try:
         zipfolder = ZipFolder.objects.create(
             node=node,
             storage_key=storage_key,
-            size=size
+            size=size,
+            fingerprint=fingerprint,
+            manifest={arcname: file_storage_key for file_storage_key, arcname, _, _ in files_info}
         )
-        task = generate_and_upload_zip_task.delay(zipfolder.id, storage_key, node.name, files_info)
-        redis_client.hset(TASK_OWNER_KEY, task.id, user.id)
+        base_zipfolder = get_base_zipfolder(node)
+        generate_and_upload_zip_task.apply_async(
+            args=(zipfolder.id, storage_key, node.name, files_info),
+            kwargs={
+                "inflight_key": inflight_key,
+                "base_zipfolder_id": base_zipfolder.id if base_zipfolder else None
+            },
+            task_id=task_id
+        )
+    except Exception:
+        release_lock(inflight_key, task_id)
+        raise
+    return task_id
+
+
+def download_node(user, node_id):
+    node = get_object_or_404(Node.active_objects.select_related("current_version"), pk=node_id)
+    if not node.is_public and not can_view(user, node) and not can_edit(user, node):
+        raise PermissionDenied()
+    if node.is_folder:
+        files_info, size, fingerprint = get_files_info(node)
+        cached = get_cached_zipfolder(node, fingerprint)
+        if cached is not None:
+            return {
+                "status": "done",
+                "filename": node.name,
+                "download_url": generate_download_sas(cached.storage_key, "zips")
+            }
+        task_id = start_zip_task(user, node, files_info, size, fingerprint)
+        add_task_owner(task_id, user.id, settings.DRIVE_ZIP_INFLIGHT_TTL)
         return {
             "status": "Zipping files",
-            "task_id": task.id
+            "task_id": task_id
         }
     else:
         download_sas_url = generate_download_sas(blob_ref=node.current_version.storage_key)
@@ -101,47 +575,50 @@ def download_node(user, node_id):
         }
     
 
+def stream_node_zip(user, node_id):
+    """
+    Zip of a small folder built on the fly from the files container, without
+    staging it in blob storage. Returns the archive name and a bytes iterator.
+    """
+    node = get_object_or_404(Node.active_objects, pk=node_id)
+    if not node.is_public and not can_view(user, node) and not can_edit(user, node):
+        raise PermissionDenied()
+    if not node.is_folder:
+        raise BadRequest("only folders can be streamed as a zip")
+    files_info, size, _ = get_files_info(node)
+    if size > settings.DRIVE_ZIP_STREAM_MAX_BYTES:
+        raise BadRequest("folder is too large to stream, use the download endpoint")
+    container = get_blob_service().get_container_client("files")
+    return node.name + ".zip", iter_zip(container, files_info)
+
+
 def get_files_info(node):
-    children = node.get_descendants().filter(
+    """
+    Returns the zip entries of a folder, their total size and a fingerprint of
+    the entries (node, version and name of every file) used to reuse zips.
+    """
+    files = node.get_descendants().filter(
         deleted_at__isnull = True,
-        status = Node.NodeStatus.ACTIVE
+        status = Node.NodeStatus.ACTIVE,
+        type = Node.NodeType.file
     ).annotate(
         rel_storage_key=F("current_version__storage_key"),
-        rel_size=F("current_version__size")
-    ).only("id", "name", "path", "type")
-
-    path_to_name = {
-        child.path: child.name for child in children
-    }
-
-    path_to_name[node.path] = node.name
-
-    steplen = node.steplen
-    root_depth = node.depth
+        rel_size=F("current_version__size"),
+        rel_mime_type=F("current_version__mime_type")
+    ).only("id", "display_path", "current_version_id")
 
+    prefix = node.display_path.rstrip("/") + "/"
     file_info = []
     size = 0
-    for child in children:
-        if child.is_folder:
-            continue
+    digest = hashlib.sha256()
+    for child in files:
+        arcname = child.display_path[len(prefix):]
         size += child.rel_size
-        chunks = [
-            child.path[i:i + steplen]
-            for i in range(root_depth * steplen, len(child.path), steplen)
-        ]
-
-        current = node.path
-        parts = []
-        for chunk in chunks:
-            current += chunk
-            parts.append(path_to_name[current])
-
-        relative_name_path = "/".join(parts)
-
         file_info.append(
-            (child.rel_storage_key, relative_name_path)
+            (child.rel_storage_key, arcname, child.rel_mime_type, child.rel_size)
         )
-    return file_info, size
+        digest.update(f"{child.id}:{child.current_version_id}:{arcname}\0".encode())
+    return file_info, size, digest.hexdigest()
 
 
 def search_for_node(user, query_text):
@@ -152,10 +629,32 @@ def search_for_node(user, query_text):
         rank=SearchRank("search_vector", search_query)
     ).filter(
         search_vector=search_query
-    ).select_related("owner").order_by("-rank", "title")
+    ).select_related("owner", "current_version").order_by("-rank", "name")
     return results
 
 
+def find_stored_blobs(entries) -> dict[tuple[str, int], StoredBlob]:
+    """
+    Verified blobs matching ``(checksum, size)`` pairs, locked so they cannot
+    be purged while new versions start pointing at them. Blobs an upload url
+    can still write to are left out. Empty unless DRIVE_UPLOAD_DEDUP is on.
+    """
+    if not settings.DRIVE_UPLOAD_DEDUP:
+        return {}
+    checksums = {checksum.lower() for checksum, _ in entries}
+    blobs = StoredBlob.objects.select_for_update().filter(
+        Q(writable_until__isnull=True) | Q(writable_until__lt=timezone.now()),
+        verified=True,
+        checksum__in=checksums
+    )
+    return {(blob.checksum, blob.size): blob for blob in blobs}
+
+
+def add_blob_references(blob_ids):
+    for blob_id, count in Counter(blob_ids).items():
+        StoredBlob.objects.filter(pk=blob_id).update(ref_count=F("ref_count") + count)
+
+
 def init_upload_process(*, user, parent_id, filename, size, mime_type, checksum):
     if parent_id is None:
         parent_node = get_or_create_root_folder(user)
@@ -165,52 +664,232 @@ def init_upload_process(*, user, parent_id, filename, size, mime_type, checksum)
         raise BadRequest("Invalid parent id")
     if not can_edit(user, parent_node):
         raise PermissionDenied()
+    check_storage_quota(user, size)
     with transaction.atomic():
+        stored_blob = find_stored_blobs([(checksum, size)]).get((checksum.lower(), size))
         new_node = Node(
             owner = user,
             name = filename,
             type = Node.NodeType.file,
-            status = Node.NodeStatus.UPLOADING,
+            status = Node.NodeStatus.ACTIVE if stored_blob else Node.NodeStatus.UPLOADING,
         )
         parent_node.add_child(instance=new_node)
 
-        storage_key = build_storage_key(user.pk, new_node.pk)
+        if stored_blob is None:
+            stored_blob = StoredBlob.objects.create(
+                storage_key=build_storage_key(user.pk, new_node.pk),
+                checksum=checksum,
+                size=size,
+                ref_count=1,
+                writable_until=get_upload_sas_expiry()
+            )
+            already_present = False
+        else:
+            add_blob_references([stored_blob.pk])
+            already_present = True
+
         node_version = NodeVersion.objects.create(
             node = new_node,
-            storage_key = storage_key,
+            storage_key = stored_blob.storage_key,
+            blob = stored_blob,
             size = size,
             mime_type = mime_type,
-            checksum = checksum
+            checksum = checksum,
+            status = NodeVersion.FileStatus.ACTIVE if already_present else NodeVersion.FileStatus.UPLOADING,
+            # a reused blob was verified against this very checksum
+            integrity = NodeVersion.IntegrityStatus.VERIFIED if already_present else NodeVersion.IntegrityStatus.PENDING
         )
-
-    upload_url = generate_upload_sas(
-        blob_ref=storage_key,
-        content_type=mime_type
-    )
+        if already_present:
+            Node.objects.filter(pk=new_node.pk).update(current_version=node_version)
+            update_user_storage_usage(user, size)
 
     return {
         "node_id": new_node.pk,
         "version_id": node_version.pk,
-        "upload_url": upload_url
+        "upload_url": None if already_present else generate_upload_sas(blob_ref=node_version.storage_key),
+        "already_present": already_present
     }
 
 
-def finalize_upload_process(*, user, version_id, node_id):
-    node = get_object_or_404(Node.active_objects, pk=node_id)
-    version = get_object_or_404(NodeVersion, pk=version_id)
-    if node.owner != user:
+def build_upload_tree(files):
+    """
+    Nests a flat upload manifest into ``{"folders": {name: subtree}, "files": [entry]}``.
+    """
+    tree = {"folders": {}, "files": []}
+    seen = set()
+    for entry in files:
+        if entry["path"] in seen:
+            raise BadRequest(f"duplicate path {entry['path']}")
+        seen.add(entry["path"])
+        *folders, filename = entry["path"].split("/")
+        subtree = tree
+        for folder in folders:
+            subtree = subtree["folders"].setdefault(folder, {"folders": {}, "files": []})
+        subtree["files"].append({**entry, "name": filename})
+    return tree
+
+
+def get_upload_tree_children(subtree, ranks):
+    """
+    Folders and files directly in an upload subtree, sorted by their
+    ``ranks`` from ``get_collation_ranks``.
+    """
+    children = [(name, sub, None) for name, sub in subtree["folders"].items()]
+    children += [(entry["name"], None, entry) for entry in subtree["files"]]
+    children.sort(key=lambda child: ranks[child[0]])
+    return children
+
+
+def plan_upload_nodes(user, parent, tree, ranks, top_level_steps):
+    """
+    Builds unsaved nodes for an upload tree with their treebeard path, depth,
+    numchild and display path set in memory. Siblings inside new folders are
+    laid out in name order; the top level takes ``top_level_steps``, one per
+    entry of ``get_upload_tree_children(tree, ranks)``.
+    Returns ``[(node, manifest entry or None, relative path)]`` in path order.
+    """
+    max_step = len(Node.alphabet) ** Node.steplen - 1
+    max_path_length = Node._meta.get_field("path").max_length
+    planned = []
+
+    def place(subtree, parent_path, parent_display_path, depth, relative_prefix, steps):
+        children = get_upload_tree_children(subtree, ranks)
+        if steps is None:
+            if len(children) > max_step:
+                raise BadRequest("too many entries in one folder")
+            steps = range(1, len(children) + 1)
+        for (name, sub, entry), step in zip(children, steps):
+            path = Node._get_path(parent_path, depth, step)
+            if len(path) > max_path_length:
+                raise BadRequest("folder structure is too deep")
+            node = Node(
+                owner=user,
+                name=name,
+                type=Node.NodeType.folder if entry is None else Node.NodeType.file,
+                status=Node.NodeStatus.ACTIVE if entry is None else Node.NodeStatus.UPLOADING,
+                path=path,
+                depth=depth,
+                numchild=0 if entry is not None else len(sub["folders"]) + len(sub["files"]),
+                display_path=Node.join_display_path(parent_display_path, name),
+            )
+            relative_path = relative_prefix + name
+            planned.append((node, entry, relative_path))
+            if entry is None:
+                place(sub, path, node.display_path, depth + 1, relative_path + "/", None)
+
+    place(tree, parent.path, parent.display_path, parent.depth + 1, "", top_level_steps)
+    return planned
+
+
+def init_bulk_upload_process(*, user, parent_id, files):
+    """
+    Creates the folders and uploading files of a whole manifest with bulk
+    inserts and returns an upload SAS url for every file.
+    """
+    if parent_id is None:
+        parent_node = get_or_create_root_folder(user)
+    else:
+        parent_node = get_object_or_404(Node.active_objects, pk=parent_id)
+    if not parent_node.is_folder:
+        raise BadRequest("Invalid parent id")
+    if not can_edit(user, parent_node):
         raise PermissionDenied()
-    if node.status != Node.NodeStatus.UPLOADING:
-        raise BadRequest
-    
-    meta = get_file_metadata(version.storage_key)
-    if not meta['status']:
-        with transaction.atomic():
-            node.status = Node.NodeStatus.DRAFT
-            node.save()
-            version.status = NodeVersion.FileStatus.FAILED
-            version.save()
-        raise NotFound("File Not Found in Storage")
+    check_storage_quota(user, sum(entry["size"] for entry in files))
+    tree = build_upload_tree(files)
+    ranks = get_collation_ranks(name for entry in files for name in entry["path"].split("/"))
+    top_level = get_upload_tree_children(tree, ranks)
+
+    with transaction.atomic():
+        # the lock keeps concurrent uploads from taking the same sibling steps
+        parent_node = Node.objects.select_for_update().get(pk=parent_node.pk)
+        top_level_steps = allocate_child_steps(parent_node, [name for name, _, _ in top_level])
+
+        planned = plan_upload_nodes(user, parent_node, tree, ranks, top_level_steps)
+        stored_blobs = find_stored_blobs([(entry["checksum"], entry["size"]) for entry in files])
+        matches = {}
+        for node, entry, _ in planned:
+            if entry is not None:
+                match = stored_blobs.get((entry["checksum"].lower(), entry["size"]))
+                if match is not None:
+                    matches[entry["path"]] = match
+                    node.status = Node.NodeStatus.ACTIVE
+
+        nodes = Node.objects.bulk_create([node for node, _, _ in planned], batch_size=500)
+        Node.objects.filter(pk=parent_node.pk).update(
+            numchild=F("numchild") + len(tree["folders"]) + len(tree["files"])
+        )
+
+        file_nodes = [(node, entry) for node, (_, entry, _) in zip(nodes, planned) if entry is not None]
+        writable_until = get_upload_sas_expiry()
+        new_blobs = iter(StoredBlob.objects.bulk_create([
+            StoredBlob(
+                storage_key=build_storage_key(user.pk, node.pk),
+                checksum=entry["checksum"],
+                size=entry["size"],
+                ref_count=1,
+                writable_until=writable_until
+            )
+            for node, entry in file_nodes if entry["path"] not in matches
+        ], batch_size=500))
+        add_blob_references([blob.pk for blob in matches.values()])
+
+        new_versions = []
+        for node, entry in file_nodes:
+            blob = matches.get(entry["path"]) or next(new_blobs)
+            new_versions.append(NodeVersion(
+                node=node,
+                version_number=1,
+                storage_key=blob.storage_key,
+                blob=blob,
+                size=entry["size"],
+                mime_type=entry["mime_type"],
+                checksum=entry["checksum"],
+                status=NodeVersion.FileStatus.ACTIVE if entry["path"] in matches else NodeVersion.FileStatus.UPLOADING,
+                integrity=NodeVersion.IntegrityStatus.VERIFIED if entry["path"] in matches else NodeVersion.IntegrityStatus.PENDING
+            ))
+        versions = NodeVersion.objects.bulk_create(new_versions, batch_size=500)
+
+        present_nodes = []
+        for (node, entry), version in zip(file_nodes, versions):
+            if entry["path"] in matches:
+                node.current_version = version
+                present_nodes.append(node)
+        Node.objects.bulk_update(present_nodes, ["current_version"], batch_size=500)
+        present_bytes = sum(node.current_version.size for node in present_nodes)
+        if present_bytes:
+            update_user_storage_usage(user, present_bytes)
+
+    upload_urls = generate_upload_sas_many([
+        version.storage_key for version in versions if version.status == NodeVersion.FileStatus.UPLOADING
+    ])
+    uploads = iter(versions)
+    folders, uploaded_files = [], []
+    for node, (_, entry, relative_path) in zip(nodes, planned):
+        if entry is None:
+            folders.append({"path": relative_path, "node_id": node.pk})
+            continue
+        version = next(uploads)
+        already_present = entry["path"] in matches
+        uploaded_files.append({
+            "path": relative_path,
+            "node_id": node.pk,
+            "version_id": version.pk,
+            "upload_url": None if already_present else upload_urls[version.storage_key],
+            "already_present": already_present
+        })
+    return {"folders": folders, "files": uploaded_files}
+
+
+FILE_NOT_FOUND = "File Not Found in Storage"
+
+
+def get_upload_problem(version, meta):
+    """
+    Why an uploaded blob does not match what was announced for the version,
+    or None when it does.
+    """
+    if not meta["status"]:
+        return FILE_NOT_FOUND
     if (
         meta["size"] == 0
         or meta["size"] != version.size
@@ -220,20 +899,379 @@ def finalize_upload_process(*, user, version_id, node_id):
             and meta["content_md5"].hex() != version.checksum
         )
     ):
-        with transaction.atomic():
-            node.status = Node.NodeStatus.DRAFT
-            node.save()
-            version.status = NodeVersion.FileStatus.FAILED
-            version.save()
-        raise BadRequest("incomplete file upload")
-    with transaction.atomic():
-        version.status = NodeVersion.FileStatus.ACTIVE
-        version.save()
-        node.status = Node.NodeStatus.ACTIVE
-        node.current_version = version
-        node.save()
-        update_user_storage_usage(user, version.size)
+        return "incomplete file upload"
+    return None
+
+
+def finalize_upload_process(*, user, version_id, node_id):
+    """
+    Finalizes one upload through ``finalize_versions``, which locks the
+    version, so the BlobCreated event finalizing it at the same time cannot
+    charge the bytes twice. An upload already finalized that way is reported
+    as a success.
+    """
+    # the node is still UPLOADING, which active_objects hides
+    version = get_object_or_404(
+        NodeVersion.objects.select_related("node"),
+        pk=version_id,
+        node_id=node_id,
+        node__deleted_at__isnull=True
+    )
+    node = version.node
+    if node.owner != user:
+        raise PermissionDenied()
+
+    if version.status == NodeVersion.FileStatus.UPLOADING and node.status == Node.NodeStatus.UPLOADING:
+        problem = finalize_versions([version]).get(version.pk)
+        if problem == FILE_NOT_FOUND:
+            raise NotFound(problem)
+        if problem is not None:
+            raise BadRequest(problem)
+        version.refresh_from_db(fields=["status"])
+    if version.status != NodeVersion.FileStatus.ACTIVE:
+        raise BadRequest("upload is not in progress")
     return {
         "filename": node.name,
         "mime_type": version.mime_type
-    }
\ No newline at end of file
+    }
+
+
+# azure drops uncommitted blocks after a week and takes at most 50,000 per blob
+RESUMABLE_UPLOAD_TTL = int(timedelta(days=7).total_seconds())
+MAX_BLOCKS_PER_BLOB = 50_000
+
+
+def get_uploading_version(user, node_id, version_id):
+    version = get_object_or_404(
+        NodeVersion.objects.select_related("node"),
+        pk=version_id,
+        node_id=node_id,
+        node__deleted_at__isnull=True
+    )
+    if version.node.owner != user:
+        raise PermissionDenied()
+    if version.status != NodeVersion.FileStatus.UPLOADING or version.node.status != Node.NodeStatus.UPLOADING:
+        raise BadRequest("upload is not in progress")
+    return version
+
+
+def get_block_id(index: int) -> str:
+    # every block id of a blob must have the same length
+    return f"{index:08d}"
+
+
+def encode_block_id(index: int) -> str:
+    # the REST api takes block ids base64 encoded, the sdk encodes and decodes them itself
+    return base64.b64encode(get_block_id(index).encode()).decode()
+
+
+def get_block_plan(version):
+    """
+    ``(block_size, block_count)`` of a resumable upload, fixed by the first
+    plan request so a resumed upload keeps the same blocks.
+    """
+    plan_key = f"{UPLOAD_BLOCKS_KEY}:{version.pk}:plan"
+    plan = redis_client.hgetall(plan_key)
+    if plan:
+        return int(plan["block_size"]), int(plan["block_count"])
+    block_size = max(settings.DRIVE_RESUMABLE_BLOCK_SIZE, -(-version.size // MAX_BLOCKS_PER_BLOB))
+    block_count = max(1, -(-version.size // block_size))
+    pipe = redis_client.pipeline()
+    pipe.hset(plan_key, mapping={"block_size": block_size, "block_count": block_count})
+    pipe.expire(plan_key, RESUMABLE_UPLOAD_TTL)
+    pipe.execute()
+    return block_size, block_count
+
+
+def describe_blocks(version, indexes, block_size):
+    StoredBlob.objects.filter(pk=version.blob_id).update(writable_until=get_upload_sas_expiry())
+    upload_url = generate_upload_sas(blob_ref=version.storage_key)
+    blocks = []
+    for index in indexes:
+        offset = index * block_size
+        block_id = encode_block_id(index)
+        blocks.append({
+            "index": index,
+            "block_id": block_id,
+            "offset": offset,
+            "length": min(block_size, version.size - offset),
+            "url": f"{upload_url}&comp=block&blockid={quote(block_id, safe='')}"
+        })
+    return blocks
+
+
+def get_staged_blocks(version, block_count):
+    """
+    Indexes of the staged blocks. Redis remembers what was already seen, the
+    uncommitted block list of the blob is only read while blocks are missing.
+    """
+    staged_key = f"{UPLOAD_BLOCKS_KEY}:{version.pk}:staged"
+    staged = {int(index) for index in redis_client.smembers(staged_key)}
+    if len(staged) < block_count:
+        expected = {get_block_id(index): index for index in range(block_count)}
+        for block_id in get_uncommitted_block_ids(version.storage_key):
+            if block_id in expected:
+                staged.add(expected[block_id])
+        if staged:
+            pipe = redis_client.pipeline()
+            pipe.sadd(staged_key, *staged)
+            pipe.expire(staged_key, RESUMABLE_UPLOAD_TTL)
+            pipe.execute()
+    return staged
+
+
+def plan_resumable_upload(*, user, node_id, version_id):
+    version = get_uploading_version(user, node_id, version_id)
+    block_size, block_count = get_block_plan(version)
+    return {
+        "version_id": version.pk,
+        "block_size": block_size,
+        "block_count": block_count,
+        "blocks": describe_blocks(version, range(block_count), block_size)
+    }
+
+
+def get_missing_blocks(*, user, node_id, version_id):
+    version = get_uploading_version(user, node_id, version_id)
+    block_size, block_count = get_block_plan(version)
+    staged = get_staged_blocks(version, block_count)
+    missing = [index for index in range(block_count) if index not in staged]
+    return {
+        "version_id": version.pk,
+        "block_count": block_count,
+        "missing": describe_blocks(version, missing, block_size)
+    }
+
+
+def commit_resumable_upload(*, user, node_id, version_id):
+    """
+    Commits the staged blocks in order, then finalizes the upload through
+    ``finalize_upload_process``. Committing fires the BlobCreated event, so
+    the upload may already be finalized by its worker; that, or a commit
+    retried after it, counts as a success.
+    """
+    try:
+        version = get_uploading_version(user, node_id, version_id)
+    except BadRequest:
+        return finalize_upload_process(user=user, version_id=version_id, node_id=node_id)
+    _, block_count = get_block_plan(version)
+    redis_client.delete(f"{UPLOAD_BLOCKS_KEY}:{version.pk}:staged")
+    staged = get_staged_blocks(version, block_count)
+    missing = [index for index in range(block_count) if index not in staged]
+    if missing:
+        raise BadRequest(f"{len(missing)} blocks are missing")
+    commit_blocks(
+        version.storage_key,
+        [get_block_id(index) for index in range(block_count)],
+        version.mime_type
+    )
+    redis_client.delete(f"{UPLOAD_BLOCKS_KEY}:{version.pk}:plan", f"{UPLOAD_BLOCKS_KEY}:{version.pk}:staged")
+    return finalize_upload_process(user=user, version_id=version.pk, node_id=version.node_id)
+
+
+def finalize_versions(versions):
+    """
+    Checks the blobs of uploading versions (with ``node`` loaded) in parallel,
+    then activates the good ones and fails the others with bulk updates and
+    one storage usage change per owner.
+    Returns ``{version_id: problem}`` (None when finalized) for the versions
+    that were handled; versions finalized concurrently elsewhere are skipped.
+    """
+    versions = {version.pk: version for version in versions}
+    metadata = get_files_metadata(version.storage_key for version in versions.values())
+    problems = {
+        pk: get_upload_problem(version, metadata[version.storage_key])
+        for pk, version in versions.items()
+    }
+
+    with transaction.atomic():
+        still_uploading = set(
+            NodeVersion.objects.select_for_update().filter(
+                pk__in=versions.keys(), status=NodeVersion.FileStatus.UPLOADING
+            ).values_list("pk", flat=True)
+        )
+        changed_versions, changed_nodes = [], []
+        added_bytes = defaultdict(int)
+        now = timezone.now()
+        for pk in still_uploading:
+            version = versions[pk]
+            node = version.node
+            if problems[pk] is None:
+                version.status = NodeVersion.FileStatus.ACTIVE
+                node.status = Node.NodeStatus.ACTIVE
+                node.current_version = version
+                added_bytes[node.owner_id] += version.size
+            else:
+                version.status = NodeVersion.FileStatus.FAILED
+                node.status = Node.NodeStatus.DRAFT
+            version.updated_at = now
+            changed_versions.append(version)
+            changed_nodes.append(node)
+
+        NodeVersion.objects.bulk_update(changed_versions, ["status", "updated_at"], batch_size=500)
+        Node.objects.bulk_update(changed_nodes, ["status", "current_version"], batch_size=500)
+        for owner_id, size in added_bytes.items():
+            update_user_storage_usage(owner_id, size)
+        finalized_ids = [pk for pk in still_uploading if problems[pk] is None]
+        if finalized_ids:
+            transaction.on_commit(lambda: verify_uploads_task.delay(finalized_ids))
+
+    return {pk: problems[pk] for pk in still_uploading}
+
+
+def uploading_versions():
+    return NodeVersion.objects.select_related("node").filter(
+        status=NodeVersion.FileStatus.UPLOADING,
+        node__status=Node.NodeStatus.UPLOADING,
+        node__deleted_at__isnull=True
+    )
+
+
+def finalize_bulk_upload_process(*, user, version_ids):
+    """
+    Finalizes many uploads of the user at once. Versions that are unknown,
+    not the user's or not uploading any more are reported as failed and
+    left alone.
+    """
+    versions = {
+        version.pk: version
+        for version in uploading_versions().filter(pk__in=version_ids, node__owner=user)
+    }
+    results = finalize_versions(versions.values())
+
+    finalized, failed = [], []
+    for pk in dict.fromkeys(version_ids):
+        if pk not in results:
+            failed.append({"version_id": pk, "reason": "not an upload in progress"})
+            continue
+        version = versions[pk]
+        if results[pk] is None:
+            finalized.append({
+                "version_id": pk,
+                "node_id": version.node_id,
+                "filename": version.node.name,
+                "mime_type": version.mime_type
+            })
+        else:
+            failed.append({"version_id": pk, "node_id": version.node_id, "reason": results[pk]})
+    return {"finalized": finalized, "failed": failed}
+
+
+def copy_version_blobs(copies):
+    """
+    Starts the server side copies behind the versions ``copy_node`` left
+    UPLOADING, ``copies`` being ``[(version id, source storage key)]``.
+    Versions whose copy is done, or could not start, are finalized here;
+    the others by the BlobCreated event once storage has finished.
+    """
+    versions = uploading_versions().in_bulk([version_id for version_id, _ in copies])
+    done = []
+    for version_id, source_key in copies:
+        version = versions.get(version_id)
+        if version is None:
+            continue
+        try:
+            copied = start_blob_copy(source_key, version.storage_key)
+        except AzureError:
+            # finalizing fails the version, its blob is purged with it later
+            copied = True
+        if copied:
+            done.append(version)
+    results = finalize_versions(done)
+    finalized = sum(1 for problem in results.values() if problem is None)
+    return {"finalized": finalized, "failed": len(results) - finalized, "pending": len(copies) - len(results)}
+
+
+def finalize_uploads_by_storage_key(storage_keys):
+    """
+    Server side completion for blobs reported as created by storage events,
+    whether or not the client calls finalize itself.
+    """
+    results = finalize_versions(uploading_versions().filter(storage_key__in=storage_keys))
+    finalized = sum(1 for problem in results.values() if problem is None)
+    return {"finalized": finalized, "failed": len(results) - finalized}
+
+
+def store_blob_digests(blob_id, md5, content_hash, seal):
+    """
+    Keeps the real checksum of a stored blob; a sealed blob also becomes
+    verified, so it can be offered for deduplication.
+    """
+    StoredBlob.objects.filter(pk=blob_id).update(checksum=md5, content_hash=content_hash)
+    if not seal:
+        return
+    try:
+        with transaction.atomic():
+            StoredBlob.objects.filter(pk=blob_id).update(verified=True)
+    except IntegrityError:
+        # the same content is already verified under another blob
+        pass
+
+
+def verify_uploaded_blobs(version_ids):
+    """
+    Recomputes the checksum of the blobs behind finalized versions, reading
+    each blob once. Versions are marked VERIFIED or MISMATCH against the
+    checksum their client declared and the blob keeps the real checksum.
+    A blob an upload url can still write to is only sealed for deduplication
+    by ``seal_written_blobs`` once that url has expired.
+    """
+    pending = NodeVersion.objects.filter(
+        pk__in=version_ids,
+        status=NodeVersion.FileStatus.ACTIVE,
+        integrity=NodeVersion.IntegrityStatus.PENDING
+    ).values_list("pk", "storage_key", "checksum", "blob_id", "blob__verified", "blob__checksum", "blob__writable_until")
+    by_key = defaultdict(list)
+    for row in pending:
+        by_key[row[1]].append(row)
+
+    counts = Counter()
+    now = timezone.now()
+    for storage_key, rows in by_key.items():
+        blob_id, blob_verified, blob_checksum, writable_until = rows[0][3:]
+        if blob_verified:
+            md5 = blob_checksum
+        else:
+            digests = hash_blob(storage_key)
+            if digests is None:
+                counts["missing"] += len(rows)
+                continue
+            md5, content_hash = digests
+            if blob_id is not None:
+                store_blob_digests(blob_id, md5, content_hash, seal=writable_until is None or writable_until <= now)
+
+        matching = [pk for pk, _, checksum, *_ in rows if checksum.lower() == md5]
+        mismatching = [pk for pk, _, checksum, *_ in rows if checksum.lower() != md5]
+        NodeVersion.objects.filter(pk__in=matching).update(integrity=NodeVersion.IntegrityStatus.VERIFIED)
+        NodeVersion.objects.filter(pk__in=mismatching).update(integrity=NodeVersion.IntegrityStatus.MISMATCH)
+        counts["verified"] += len(matching)
+        counts["mismatch"] += len(mismatching)
+    return dict(counts)
+
+
+def seal_written_blobs(blob_ids):
+    """
+    Verifies blobs checked at upload completion whose upload urls have all
+    expired since, hashing them again because the uploader could still
+    write until then. When the content changed meanwhile, the versions on
+    the blob are checked again against the new checksum.
+    """
+    counts = Counter()
+    blobs = StoredBlob.objects.filter(pk__in=blob_ids, verified=False).values_list("pk", "storage_key", "content_hash")
+    for blob_id, storage_key, checked_hash in blobs:
+        digests = hash_blob(storage_key)
+        if digests is None:
+            counts["missing"] += 1
+            continue
+        md5, content_hash = digests
+        if content_hash != checked_hash:
+            NodeVersion.objects.filter(blob_id=blob_id).exclude(integrity=NodeVersion.IntegrityStatus.PENDING).update(
+                integrity=Case(
+                    When(checksum__iexact=md5, then=Value(NodeVersion.IntegrityStatus.VERIFIED)),
+                    default=Value(NodeVersion.IntegrityStatus.MISMATCH)
+                )
+            )
+            counts["changed"] += 1
+        store_blob_digests(blob_id, md5, content_hash, seal=True)
+        counts["sealed"] += 1
+    return dict(counts)
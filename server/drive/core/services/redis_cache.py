@@ -12,4 +12,34 @@ redis_client = redis.StrictRedis(
 
 TASK_OWNER_KEY = "downloading:celery:task_owner"
 VECTOR_OWNER_KEY = "vectorise:celery:task_owner"
-VECTOR_STATUS_KEY = "vectorise:celery:task_status"
\ No newline at end of file
+VECTOR_STATUS_KEY = "vectorise:celery:task_status"
+ZIP_INFLIGHT_KEY = "downloading:zip:inflight"
+UPLOAD_BLOCKS_KEY = "uploading:blocks"
+
+# deletes the lock only while it still holds the caller's token
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def acquire_lock(key, token, ttl):
+    return bool(redis_client.set(key, token, nx=True, ex=ttl))
+
+
+def release_lock(key, token):
+    return redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, key, token)
+
+
+def add_task_owner(task_id, user_id, ttl):
+    owners_key = f"{TASK_OWNER_KEY}:{task_id}"
+    pipe = redis_client.pipeline()
+    pipe.sadd(owners_key, user_id)
+    pipe.expire(owners_key, ttl)
+    pipe.execute()
+
+
+def is_task_owner(task_id, user_id):
+    return bool(redis_client.sismember(f"{TASK_OWNER_KEY}:{task_id}", user_id))
@@ -0,0 +1,297 @@
+import copy
+import io
+import struct
+import time
+import zipfile
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+from django.conf import settings
+
+# Formats that are already compressed: deflating them again burns CPU for
+# a few bytes at best, so they are stored as-is.
+STORED_MIME_TYPES = {
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/vnd.rar",
+    "application/x-bzip2",
+    "application/x-xz",
+    "application/epub+zip",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.oasis.opendocument.text",
+    "application/vnd.oasis.opendocument.presentation",
+    "application/vnd.oasis.opendocument.spreadsheet",
+    "image/jpeg",
+    "image/png",
+    "image/gif",
+    "image/webp",
+    "image/avif",
+    "image/heic",
+}
+STORED_MIME_PREFIXES = ("video/", "audio/")
+
+
+class ZipSource(NamedTuple):
+    storage_key: str
+    arcname: str
+    mime_type: str
+    size: int
+
+
+def get_compress_type(mime_type: str | None) -> int:
+    mime_type = (mime_type or "").split(";")[0].strip().lower()
+    if mime_type in STORED_MIME_TYPES or mime_type.startswith(STORED_MIME_PREFIXES):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def iter_blob_contents(container, sources, max_workers=None, max_buffer_bytes=None):
+    """
+    Yields ``(source, chunks)`` in the order of ``sources``.
+
+    Blobs that fit in the buffer budget are downloaded ahead of the consumer by
+    a thread pool, so the next entries are already in memory while the current
+    one is compressed. Blobs bigger than the whole budget are streamed in
+    chunks when they are reached, while the pool keeps prefetching behind them.
+    """
+    max_workers = max_workers or settings.DRIVE_ZIP_PREFETCH_WORKERS
+    max_buffer_bytes = max_buffer_bytes or settings.DRIVE_ZIP_PREFETCH_BUFFER_BYTES
+    max_pending = max_workers * 2
+
+    def download(source):
+        return container.get_blob_client(source.storage_key).download_blob().readall()
+
+    upcoming = iter(sources)
+    next_source = next(upcoming, None)
+    pending = deque()
+    buffered = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="zip-prefetch") as pool:
+        def top_up():
+            nonlocal next_source, buffered
+            while next_source is not None and len(pending) < max_pending:
+                if next_source.size > max_buffer_bytes:
+                    pending.append((next_source, None))
+                elif buffered + next_source.size <= max_buffer_bytes:
+                    pending.append((next_source, pool.submit(download, next_source)))
+                    buffered += next_source.size
+                else:
+                    break
+                next_source = next(upcoming, None)
+
+        try:
+            top_up()
+            while pending:
+                source, future = pending.popleft()
+                top_up()
+                if future is None:
+                    yield source, container.get_blob_client(source.storage_key).download_blob().chunks()
+                else:
+                    yield source, (future.result(),)
+                    buffered -= source.size
+                    top_up()
+        finally:
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+
+
+class ReusedEntry(NamedTuple):
+    zinfo: zipfile.ZipInfo
+    offset: int
+    length: int
+
+
+class BlobRangeReader(io.RawIOBase):
+    """
+    Seekable read-only view of a blob where every read is a ranged download,
+    enough for ``zipfile`` to parse the central directory without fetching
+    the whole archive.
+    """
+    def __init__(self, blob_client, size=None):
+        self.blob_client = blob_client
+        self.size = size if size is not None else blob_client.get_blob_properties().size
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._position = max(0, offset)
+        return self._position
+
+    def readinto(self, b):
+        length = min(len(b), self.size - self._position)
+        if length <= 0:
+            return 0
+        data = self.blob_client.download_blob(offset=self._position, length=length).readall()
+        b[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+def _strip_zip64_extra(extra: bytes) -> bytes:
+    # zipfile writes a fresh ZIP64 field into the central directory when the new offsets need one
+    kept = []
+    i = 0
+    while i + 4 <= len(extra):
+        header_id, size = struct.unpack("<HH", extra[i:i + 4])
+        if header_id != 1:
+            kept.append(extra[i:i + 4 + size])
+        i += 4 + size
+    return b"".join(kept)
+
+
+def read_reusable_entries(blob_client, manifest, sources) -> dict[str, ReusedEntry]:
+    """
+    Entries of a previous archive that can be copied verbatim: same archive name
+    and same blob (``manifest`` maps archive names to storage keys).
+    The byte range of an entry spans its local header, data and data descriptor.
+    """
+    # sibling files may share a name; those entries are simply rebuilt
+    counts = Counter(source.arcname for source in sources)
+    wanted = {
+        source.arcname for source in sources
+        if counts[source.arcname] == 1 and manifest.get(source.arcname) == source.storage_key
+    }
+    if not wanted:
+        return {}
+
+    reader = io.BufferedReader(BlobRangeReader(blob_client), buffer_size=64 * 1024)
+    with zipfile.ZipFile(reader) as old_zip:
+        infos = sorted(old_zip.infolist(), key=lambda zinfo: zinfo.header_offset)
+        ends = [zinfo.header_offset for zinfo in infos[1:]] + [old_zip.start_dir]
+
+    old_counts = Counter(zinfo.filename for zinfo in infos)
+    reusable = {}
+    for zinfo, end in zip(infos, ends):
+        if zinfo.filename in wanted and old_counts[zinfo.filename] == 1:
+            reusable[zinfo.filename] = ReusedEntry(zinfo, zinfo.header_offset, end - zinfo.header_offset)
+    return reusable
+
+
+def copy_zip_entry(zf: zipfile.ZipFile, base_blob_client, entry: ReusedEntry):
+    """
+    Appends an entry of the previous archive as raw bytes, so it is neither
+    downloaded from the files container nor compressed again.
+    """
+    zinfo = copy.copy(entry.zinfo)
+    zinfo.header_offset = zf.fp.tell()
+    zinfo.extra = _strip_zip64_extra(zinfo.extra)
+    for chunk in base_blob_client.download_blob(offset=entry.offset, length=entry.length).chunks():
+        zf.fp.write(chunk)
+    zf.filelist.append(zinfo)
+    zf.NameToInfo[zinfo.filename] = zinfo
+    zf.start_dir = zf.fp.tell()
+
+
+def new_zip_info(source: ZipSource) -> zipfile.ZipInfo:
+    zinfo = zipfile.ZipInfo(source.arcname, date_time=time.localtime(time.time())[:6])
+    zinfo.compress_type = get_compress_type(source.mime_type)
+    # a known size lets zipfile decide up front whether the entry needs ZIP64
+    zinfo.file_size = source.size
+    return zinfo
+
+
+class ChunkSink(io.RawIOBase):
+    """
+    Write-only buffer that hands out what was written so far, for streaming
+    an archive while it is being built.
+    """
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._position += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _write_entries(fileobj, container, sources, max_workers, max_buffer_bytes, base_blob_client, reusable):
+    """
+    Writes the archive, yielding after every entry chunk so the caller can
+    forward what has been written to ``fileobj`` so far.
+    """
+    sources = [ZipSource(*source) for source in sources]
+    reusable = reusable or {}
+    fresh = iter_blob_contents(
+        container,
+        [source for source in sources if source.arcname not in reusable],
+        max_workers,
+        max_buffer_bytes
+    )
+    try:
+        with zipfile.ZipFile(fileobj, mode="w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            for source in sources:
+                if source.arcname in reusable:
+                    copy_zip_entry(zf, base_blob_client, reusable[source.arcname])
+                    yield
+                    continue
+                _, chunks = next(fresh)
+                with zf.open(new_zip_info(source), "w") as zf_entry:
+                    for chunk in chunks:
+                        zf_entry.write(chunk)
+                        yield
+                yield
+        yield
+    finally:
+        fresh.close()
+
+
+def write_zip(
+    fileobj,
+    container,
+    sources,
+    max_workers=None,
+    max_buffer_bytes=None,
+    base_blob_client=None,
+    reusable=None
+):
+    """
+    Writes the blobs behind ``sources`` into a zip archive on ``fileobj``,
+    which only needs ``write`` and ``tell`` (no seeking).
+
+    Entries found in ``reusable`` are copied from the previous archive behind
+    ``base_blob_client`` instead (see ``read_reusable_entries``).
+    """
+    for _ in _write_entries(fileobj, container, sources, max_workers, max_buffer_bytes, base_blob_client, reusable):
+        pass
+
+
+def iter_zip(container, sources, max_workers=None, max_buffer_bytes=None):
+    """
+    Yields the bytes of a zip archive of ``sources`` as it is built (ZIP64 and
+    data descriptors, nothing is seeked back), for streaming responses.
+    """
+    sink = ChunkSink()
+    for _ in _write_entries(sink, container, sources, max_workers, max_buffer_bytes, None, None):
+        data = sink.drain()
+        if data:
+            yield data
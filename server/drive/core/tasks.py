@@ -2,23 +2,49 @@ import zipfile
 from celery import shared_task
 from drive.core.services.azure_blob import generate_download_sas
 from drive.core.services.azure_blob import get_blob_service, AzureBlockStreamer
-from drive.models import ZipFolder
+from azure.core.exceptions import ResourceNotFoundError
+from drive.core.services.zip_builder import write_zip, read_reusable_entries, ZipSource
+from drive.models import ZipFolder, Node, NodeVersion, StoredBlob
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q, F, Count, Exists, OuterRef, Case, When, Value, SET_NULL
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from datetime import timedelta
+from collections import Counter, defaultdict
+from guardian.models import UserObjectPermission, GroupObjectPermission
+from drive.core.services.redis_cache import release_lock
 from celery.utils.log import get_task_logger
 
 logger = get_task_logger(__name__)
 
 
-def stream_upload(streamer, container, files):
-    with zipfile.ZipFile(streamer, mode='w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
-        for blob_name, arcname in files:
-            src_blob = container.get_blob_client(blob_name)
-            
-            with zf.open(arcname, "w") as zf_entry:
-                download_stream = src_blob.download_blob()
-                for chunk in download_stream.chunks():
-                    zf_entry.write(chunk)
+def get_reusable_entries(blob_service_client, base_zipfolder_id, files, zip_container_name):
+    """
+    Entries of the previous zip of the folder that can be copied as they are,
+    or nothing when that archive is gone or unreadable.
+    """
+    base = ZipFolder.objects.filter(
+        pk=base_zipfolder_id, status=ZipFolder.ZipFolderStatus.COMPLETED
+    ).only("storage_key", "manifest").first()
+    if base is None:
+        return None, {}
+    base_blob_client = blob_service_client.get_blob_client(container=zip_container_name, blob=base.storage_key)
+    try:
+        sources = [ZipSource(*file) for file in files]
+        return base_blob_client, read_reusable_entries(base_blob_client, base.manifest, sources)
+    except (ResourceNotFoundError, zipfile.BadZipFile) as e:
+        logger.warning(f"Rebuilding zip from scratch, previous archive unusable: {str(e)}")
+        return None, {}
+
 
-    streamer.finalize()
+def stream_upload(streamer, container, files, base_blob_client=None, reusable=None):
+    try:
+        write_zip(streamer, container, files, base_blob_client=base_blob_client, reusable=reusable)
+        streamer.finalize()
+    finally:
+        streamer.close()
 
 @shared_task(bind=True)
 def generate_and_upload_zip_task(
@@ -26,20 +52,35 @@ def generate_and_upload_zip_task(
     zipfolder_id: int,
     zipfile_storage_key: str,
     zip_filename: str,
-    files_info: list[tuple[str, str]],
+    files_info: list[tuple[str, str, str, int]],
     zip_container_name: str = "zips",
-    files_container_name: str = "files"
+    files_container_name: str = "files",
+    inflight_key: str | None = None,
+    base_zipfolder_id: int | None = None
 ):
     blob_service_client = get_blob_service()
     blob_client = blob_service_client.get_blob_client(container=zip_container_name, blob=zipfile_storage_key)
     streamer = AzureBlockStreamer(blob_client)
     container = blob_service_client.get_container_client(files_container_name)
     try:
-        stream_upload(streamer=streamer, container=container, files=files_info)
+        base_blob_client, reusable = None, {}
+        if base_zipfolder_id:
+            base_blob_client, reusable = get_reusable_entries(
+                blob_service_client, base_zipfolder_id, files_info, zip_container_name
+            )
+        stream_upload(
+            streamer=streamer,
+            container=container,
+            files=files_info,
+            base_blob_client=base_blob_client,
+            reusable=reusable
+        )
         download_sas_url = generate_download_sas(zipfile_storage_key, zip_container_name)
         ZipFolder.objects.filter(pk=zipfolder_id).update(
             status=ZipFolder.ZipFolderStatus.COMPLETED
         )
+        if inflight_key:
+            release_lock(inflight_key, self.request.id)
 
         return {
             "status": "success",
@@ -53,4 +94,234 @@ def generate_and_upload_zip_task(
             ZipFolder.objects.filter(pk=zipfolder_id).update(
                 status=ZipFolder.ZipFolderStatus.FAILED
             )
-        raise self.retry(exc=e, countdown=60, max_retries=3)
\ No newline at end of file
+            if inflight_key:
+                release_lock(inflight_key, self.request.id)
+        raise self.retry(exc=e, countdown=60, max_retries=3)
+
+
+# Azure blob batch requests take at most 256 sub-requests
+BLOB_BATCH_LIMIT = 256
+
+
+@shared_task
+def purge_expired_zips_task(batch_size: int = BLOB_BATCH_LIMIT, zip_container_name: str = "zips"):
+    """
+    Deletes the blobs of expired zips and marks their rows DELETED.
+    Rows are walked by primary key in batches locked with SKIP LOCKED, so
+    several runs can work side by side without touching the same zips.
+    Blobs that could not be deleted keep their row for the next run.
+    """
+    batch_size = min(batch_size, BLOB_BATCH_LIMIT)
+    container = get_blob_service().get_container_client(zip_container_name)
+    now = timezone.now()
+    last_id = 0
+    deleted = 0
+    reclaimed_bytes = 0
+
+    while True:
+        with transaction.atomic():
+            batch = list(
+                ZipFolder.objects.select_for_update(skip_locked=True).filter(
+                    ~Q(status=ZipFolder.ZipFolderStatus.DELETED),
+                    expires_at__lte=now,
+                    pk__gt=last_id
+                ).order_by("pk").values_list("pk", "storage_key", "size")[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            responses = container.delete_blobs(
+                *[storage_key for _, storage_key, _ in batch],
+                raise_on_any_failure=False
+            )
+            purged_ids = []
+            for (pk, storage_key, size), response in zip(batch, responses):
+                # 404: the blob never got committed or is already gone
+                if response.status_code in (202, 404):
+                    purged_ids.append(pk)
+                    reclaimed_bytes += size if response.status_code == 202 else 0
+                else:
+                    logger.warning(f"Could not delete zip {storage_key}: {response.status_code}")
+
+            ZipFolder.objects.filter(pk__in=purged_ids).update(
+                status=ZipFolder.ZipFolderStatus.DELETED
+            )
+            deleted += len(purged_ids)
+
+    logger.info(f"Purged {deleted} expired zips, {reclaimed_bytes} bytes reclaimed")
+    return {"deleted": deleted, "reclaimed_bytes": reclaimed_bytes}
+
+
+def release_blob_references(nodes):
+    """
+    Drops the references the versions of ``nodes`` hold on their stored blobs,
+    with one UPDATE per distinct reference count.
+    """
+    references = NodeVersion.objects.filter(node__in=nodes, blob__isnull=False).values("blob_id").annotate(
+        references=Count("pk")
+    ).values_list("blob_id", "references")
+    blobs_by_count = defaultdict(list)
+    for blob_id, count in references:
+        blobs_by_count[count].append(blob_id)
+    for count, blob_ids in blobs_by_count.items():
+        StoredBlob.objects.filter(pk__in=blob_ids).update(ref_count=Greatest(F("ref_count") - count, 0))
+
+
+def purge_unreferenced_blobs(container):
+    """
+    Deletes the blobs no version points at any more, in batches locked with
+    SKIP LOCKED. Rows whose blob could not be deleted are kept for the next run.
+    """
+    last_id = 0
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StoredBlob.objects.select_for_update(skip_locked=True).filter(
+                    ~Exists(NodeVersion.objects.filter(blob=OuterRef("pk"))),
+                    ref_count=0,
+                    pk__gt=last_id
+                ).order_by("pk").values_list("pk", "storage_key")[:BLOB_BATCH_LIMIT]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            responses = container.delete_blobs(
+                *[storage_key for _, storage_key in batch],
+                raise_on_any_failure=False
+            )
+            purged_ids = []
+            for (pk, storage_key), response in zip(batch, responses):
+                if response.status_code in (202, 404):
+                    purged_ids.append(pk)
+                else:
+                    logger.warning(f"Could not delete blob {storage_key}: {response.status_code}")
+            StoredBlob.objects.filter(pk__in=purged_ids).delete()
+            deleted += len(purged_ids)
+    return deleted
+
+
+def delete_node_rows(node_ids):
+    """
+    Deletes nodes by primary key with set-based deletes, bypassing treebeard
+    and the Django collector so nothing is loaded into Python. Rows pointing
+    at the nodes are deleted or detached first, per their ``on_delete``.
+    Returns the number of nodes deleted.
+    """
+    nodes = Node.objects.filter(pk__in=node_ids)
+    release_blob_references(nodes)
+    content_type = ContentType.objects.get_for_model(Node)
+    object_keys = [str(pk) for pk in node_ids]
+    related = [
+        model.objects.filter(content_type=content_type, object_pk__in=object_keys)
+        for model in (UserObjectPermission, GroupObjectPermission)
+    ]
+    related.append(Node.tags.through.objects.filter(node_id__in=node_ids))
+    # reverse relations of other apps too, such as the vector usage of a document
+    for relation in Node._meta.related_objects:
+        rows = relation.related_model._base_manager.filter(**{f"{relation.field.name}__in": node_ids})
+        if relation.on_delete is SET_NULL:
+            rows.update(**{relation.field.name: None})
+        else:
+            related.append(rows)
+    for rows in related:
+        rows._raw_delete(rows.db)
+    return nodes._raw_delete(nodes.db)
+
+
+@shared_task
+def purge_trash_task(batch_size: int = 500, container_name: str = "files"):
+    """
+    Hard deletes what has been in the trash for longer than
+    DRIVE_TRASH_RETENTION_DAYS, then the blobs left without references.
+    Each round locks the expired trashed nodes with SKIP LOCKED and deletes at
+    most ``batch_size`` nodes of their subtrees, deepest first, so a trashed
+    node goes once its subtree is gone and its parent's numchild is fixed then.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.DRIVE_TRASH_RETENTION_DAYS)
+    purged_nodes = 0
+
+    while True:
+        with transaction.atomic():
+            trashed = dict(
+                Node.objects.select_for_update(skip_locked=True).filter(
+                    status=Node.NodeStatus.TRASHED,
+                    deleted_at__lte=cutoff
+                ).order_by("pk").values_list("pk", "path")[:batch_size]
+            )
+            if not trashed:
+                break
+            subtrees = Q()
+            for path in trashed.values():
+                subtrees |= Q(path__startswith=path)
+            batch = list(
+                Node.objects.filter(subtrees).order_by("-depth", "pk").values_list("pk", flat=True)[:batch_size]
+            )
+            purged_nodes += delete_node_rows(batch)
+
+            emptied = Counter(trashed[pk][:-Node.steplen] for pk in batch if pk in trashed)
+            if emptied:
+                Node.objects.filter(path__in=emptied).update(numchild=F("numchild") - Case(
+                    *[When(path=path, then=Value(count)) for path, count in emptied.items()]
+                ))
+
+    container = get_blob_service().get_container_client(container_name)
+    purged_blobs = purge_unreferenced_blobs(container)
+    logger.info(f"Purged {purged_nodes} trashed nodes and {purged_blobs} blobs")
+    return {"nodes": purged_nodes, "blobs": purged_blobs}
+
+
+@shared_task
+def finalize_uploads_task(storage_keys: list[str]):
+    # imported here, node_manager imports this module to queue zip jobs
+    from drive.core.services.node_manager import finalize_uploads_by_storage_key
+    return finalize_uploads_by_storage_key(storage_keys)
+
+
+@shared_task
+def copy_blobs_task(copies: list[tuple[int, str]]):
+    from drive.core.services.node_manager import copy_version_blobs
+    return copy_version_blobs(copies)
+
+
+@shared_task
+def verify_uploads_task(version_ids: list[int]):
+    from drive.core.services.node_manager import verify_uploaded_blobs
+    return verify_uploaded_blobs(version_ids)
+
+
+@shared_task
+def verify_pending_uploads_task(batch_size: int = 500):
+    """
+    Catches up on upload verification in batches by primary key: finalized
+    versions still waiting for their check, then blobs checked while an
+    upload url could write to them whose urls have all expired since.
+    """
+    from drive.core.services.node_manager import verify_uploaded_blobs, seal_written_blobs
+    counts = defaultdict(int)
+    pending = [
+        (verify_uploaded_blobs, NodeVersion.objects.filter(
+            status=NodeVersion.FileStatus.ACTIVE,
+            integrity=NodeVersion.IntegrityStatus.PENDING
+        )),
+        (seal_written_blobs, StoredBlob.objects.filter(
+            verified=False,
+            ref_count__gt=0,
+            writable_until__lt=timezone.now()
+        ).exclude(content_hash="").exclude(
+            # duplicates of content verified under another blob stay unverified
+            Exists(StoredBlob.objects.filter(verified=True, checksum=OuterRef("checksum"), size=OuterRef("size")))
+        )),
+    ]
+    for verify, queryset in pending:
+        last_id = 0
+        while True:
+            ids = list(queryset.filter(pk__gt=last_id).order_by("pk").values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            for outcome, count in verify(ids).items():
+                counts[outcome] += count
+    return dict(counts)
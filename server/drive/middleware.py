@@ -0,0 +1,15 @@
+from drive.utils.permissions import permission_cache
+
+
+class PermissionCacheMiddleware:
+    """
+    Scopes node permission lookups to the request, so views, serializers and
+    services asking about the same ancestor chain share one query.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with permission_cache():
+            return self.get_response(request)
@@ -0,0 +1,67 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+PERM_ACCESS_LEVELS = {
+    "view_node": "viewer",
+    "edit_node": "editor",
+}
+
+
+def backfill_node_access(apps, schema_editor):
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    UserObjectPermission = apps.get_model("guardian", "UserObjectPermission")
+    NodeAccess = apps.get_model("drive", "NodeAccess")
+    Node = apps.get_model("drive", "Node")
+
+    node_ct = ContentType.objects.filter(app_label="drive", model="node").first()
+    if node_ct is None:
+        return
+    grants = [
+        (int(object_pk), user_id, codename)
+        for object_pk, user_id, codename in UserObjectPermission.objects.filter(
+            content_type=node_ct,
+            permission__codename__in=PERM_ACCESS_LEVELS.keys()
+        ).values_list("object_pk", "user_id", "permission__codename")
+    ]
+    existing_ids = set(
+        Node.objects.filter(id__in={node_id for node_id, _, _ in grants}).values_list("id", flat=True)
+    )
+    NodeAccess.objects.bulk_create(
+        [
+            NodeAccess(node_id=node_id, user_id=user_id, level=PERM_ACCESS_LEVELS[codename])
+            for node_id, user_id, codename in grants
+            if node_id in existing_ids
+        ],
+        batch_size=1000,
+        ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0001_initial'),
+        ('guardian', '0002_generic_permissions_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NodeAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('viewer', 'Viewer'), ('editor', 'Editor')], max_length=6)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('node', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access_entries', to='drive.node')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='node_access', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('node', 'user', 'level'), name='unique_node_access')],
+            },
+        ),
+        migrations.RunPython(backfill_node_access, migrations.RunPython.noop),
+    ]
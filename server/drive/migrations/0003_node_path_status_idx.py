@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0002_nodeaccess'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='node',
+            index=models.Index(fields=['path', 'status', 'deleted_at'], name='node_path_status_idx'),
+        ),
+    ]
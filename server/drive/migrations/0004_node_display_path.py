@@ -0,0 +1,39 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:37
+
+from django.db import migrations, models
+
+
+def backfill_display_path(apps, schema_editor):
+    Node = apps.get_model("drive", "Node")
+    steplen = 4
+    display_paths = {}
+    batch = []
+    for node in Node.objects.order_by("path").only("id", "path", "depth", "name").iterator(chunk_size=2000):
+        if node.depth <= 1:
+            node.display_path = "/"
+        else:
+            parent_display_path = display_paths.get(node.path[:-steplen], "/")
+            node.display_path = parent_display_path.rstrip("/") + "/" + node.name
+        display_paths[node.path] = node.display_path
+        batch.append(node)
+        if len(batch) >= 2000:
+            Node.objects.bulk_update(batch, ["display_path"])
+            batch = []
+    if batch:
+        Node.objects.bulk_update(batch, ["display_path"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0003_node_path_status_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='node',
+            name='display_path',
+            field=models.TextField(default='', editable=False, help_text='Slash separated names from below the root down to this node'),
+        ),
+        migrations.RunPython(backfill_display_path, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0004_node_display_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zipfolder',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', help_text='sha256 of the zipped entries, reused while the folder content is unchanged', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='zipfolder',
+            index=models.Index(fields=['node', 'fingerprint', 'status'], name='zipfolder_fingerprint_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0005_zipfolder_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zipfolder',
+            name='manifest',
+            field=models.JSONField(blank=True, default=dict, help_text='Archive name to storage key of every entry, used to rebuild the zip incrementally'),
+        ),
+    ]
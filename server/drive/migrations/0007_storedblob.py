@@ -0,0 +1,69 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_stored_blobs(apps, schema_editor):
+    NodeVersion = apps.get_model("drive", "NodeVersion")
+    StoredBlob = apps.get_model("drive", "StoredBlob")
+    versions = NodeVersion.objects.filter(blob__isnull=True).only("id", "storage_key", "checksum", "size")
+    batch = []
+
+    def flush(batch):
+        blobs = StoredBlob.objects.bulk_create([
+            StoredBlob(storage_key=v.storage_key, checksum=v.checksum, size=v.size, ref_count=1)
+            for v in batch
+        ])
+        for version, blob in zip(batch, blobs):
+            version.blob_id = blob.id
+        NodeVersion.objects.bulk_update(batch, ["blob"])
+
+    for version in versions.iterator(chunk_size=2000):
+        batch.append(version)
+        if len(batch) >= 2000:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0006_zipfolder_manifest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('storage_key', models.CharField(max_length=512, unique=True)),
+                ('checksum', models.CharField(help_text='MD5 hash of the content', max_length=64)),
+                ('size', models.PositiveBigIntegerField(help_text='Size of the blob in bytes')),
+                ('ref_count', models.PositiveIntegerField(default=0, help_text='Versions pointing at this blob')),
+                ('verified', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='nodeversion',
+            name='unique_file_place',
+        ),
+        migrations.AlterField(
+            model_name='nodeversion',
+            name='storage_key',
+            field=models.CharField(db_index=True, max_length=512),
+        ),
+        migrations.AddConstraint(
+            model_name='storedblob',
+            constraint=models.UniqueConstraint(condition=models.Q(('verified', True)), fields=('checksum', 'size'), name='unique_verified_blob'),
+        ),
+        migrations.AddField(
+            model_name='nodeversion',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='versions', to='drive.storedblob'),
+        ),
+        migrations.RunPython(backfill_stored_blobs, migrations.RunPython.noop),
+    ]
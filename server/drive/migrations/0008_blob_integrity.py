@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0007_storedblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='nodeversion',
+            name='integrity',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('VERIFIED', 'Verified'), ('MISMATCH', 'Mismatch')], default='PENDING', help_text='Whether the checksum was recomputed from the stored blob and matched', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='storedblob',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', help_text='BLAKE2b-256 of the content, computed server side', max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0008_blob_integrity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedblob',
+            name='writable_until',
+            field=models.DateTimeField(blank=True, help_text='When the last upload url issued for the blob stops accepting writes', null=True),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 from treebeard.mp_tree import MP_Node, MP_NodeManager
 from django.contrib.auth.models import User
 from django.db import transaction
@@ -66,6 +68,11 @@ class Node(MP_Node):
     )
     search_vector = SearchVectorField(null=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
+    display_path = models.TextField(
+        default="",
+        editable=False,
+        help_text="Slash separated names from below the root down to this node"
+    )
     node_order_by = ['name']
 
     active_objects = SoftDeleteNodeManager()
@@ -73,6 +80,78 @@ class Node(MP_Node):
     @property
     def is_folder(self):
         return self.type == self.NodeType.folder
+
+    @property
+    def parent_display_path(self):
+        # names may contain "/", so the name is cut off by length
+        return self.display_path[:-len(self.name) - 1] or "/"
+
+    @staticmethod
+    def join_display_path(parent_display_path, name):
+        return parent_display_path.rstrip("/") + "/" + name
+
+    # fields whose loaded values tell save() the node was renamed or moved
+    SNAPSHOT_FIELDS = ("name", "path", "display_path")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._take_snapshot()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._take_snapshot(fields)
+
+    def _take_snapshot(self, fields=None):
+        snapshot = self.__dict__.setdefault("_loaded_values", {})
+        for field in fields or self.SNAPSHOT_FIELDS:
+            if field in self.SNAPSHOT_FIELDS and field in self.__dict__:
+                snapshot[field] = self.__dict__[field]
+
+    def _compute_display_path(self):
+        if self.depth <= 1:
+            return "/"
+        parent = getattr(self, "_cached_parent_obj", None)
+        if parent is not None and parent.display_path:
+            parent_display_path = parent.display_path
+        else:
+            parent_display_path = Node.objects.filter(
+                path=self.path[:-self.steplen]
+            ).values_list("display_path", flat=True).first() or "/"
+        return self.join_display_path(parent_display_path, self.name)
+
+    def save(self, *args, **kwargs):
+        loaded = self.__dict__.get("_loaded_values", {})
+        renamed = "name" in loaded and self.name != loaded["name"]
+        moved = "path" in loaded and self.path[:-self.steplen] != loaded["path"][:-self.steplen]
+        old_display_path = None
+        if self._state.adding or not self.display_path or renamed or moved:
+            old_display_path = loaded.get("display_path")
+            self.display_path = self._compute_display_path()
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and "display_path" not in update_fields:
+                kwargs["update_fields"] = [*update_fields, "display_path"]
+
+        super().save(*args, **kwargs)
+
+        if old_display_path and old_display_path != self.display_path and self.numchild:
+            self.rebase_descendant_display_paths(old_display_path, self.display_path)
+        self._take_snapshot()
+
+    def rebase_descendant_display_paths(self, old_prefix, new_prefix):
+        """
+        Rewrites the display path of the whole subtree in one UPDATE.
+        """
+        Node.objects.filter(
+            path__startswith=self.path,
+            depth__gt=self.depth
+        ).update(
+            display_path=Concat(
+                Value(new_prefix.rstrip("/")),
+                Substr("display_path", len(old_prefix.rstrip("/")) + 1)
+            )
+        )
     
     class Meta:
         permissions = [
@@ -80,6 +159,7 @@ class Node(MP_Node):
         ]
         indexes = [
             GinIndex(fields=["search_vector"]),
+            models.Index(fields=["path", "status", "deleted_at"], name="node_path_status_idx"),
         ]
 
     def __str__(self):
@@ -87,12 +167,54 @@ class Node(MP_Node):
     
 
 
+class StoredBlob(models.Model):
+    """
+    A blob in the files container, shared by every version with the same
+    content. Only verified blobs (checksum recomputed server side) whose
+    upload urls have all expired are offered for deduplication.
+    """
+    storage_key = models.CharField(max_length=512, unique=True)
+    checksum = models.CharField(max_length=64, help_text="MD5 hash of the content")
+    size = models.PositiveBigIntegerField(help_text="Size of the blob in bytes")
+    ref_count = models.PositiveIntegerField(default=0, help_text="Versions pointing at this blob")
+    verified = models.BooleanField(default=False)
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        help_text="BLAKE2b-256 of the content, computed server side"
+    )
+    writable_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the last upload url issued for the blob stops accepting writes"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["checksum", "size"],
+                condition=models.Q(verified=True),
+                name="unique_verified_blob"
+            ),
+        ]
+
+    def __str__(self):
+        return self.storage_key
+
+
 class NodeVersion(TimeStampedModel):
     class FileStatus(models.TextChoices):
         UPLOADING = "UPLOADING"
         ACTIVE = "ACTIVE"
         FAILED = "FAILED"
 
+    class IntegrityStatus(models.TextChoices):
+        PENDING = "PENDING"
+        VERIFIED = "VERIFIED"
+        MISMATCH = "MISMATCH"
+
     class StorageProvider(models.TextChoices):
         AZURE = "azure", "Azure Blob Storage"
         AWS = "aws", "AWS S3"
@@ -101,7 +223,14 @@ class NodeVersion(TimeStampedModel):
     node = models.ForeignKey(Node, on_delete=models.CASCADE, related_name="versions")
     version_number = models.PositiveSmallIntegerField()
     storage_provider = models.CharField(max_length=128, choices=StorageProvider.choices, default=StorageProvider.AZURE)
-    storage_key = models.CharField(max_length=512, unique=True)
+    storage_key = models.CharField(max_length=512, db_index=True)
+    blob = models.ForeignKey(
+        StoredBlob,
+        on_delete=models.PROTECT,
+        related_name="versions",
+        null=True,
+        blank=True
+    )
 
     size = models.PositiveBigIntegerField(help_text="Size of the file in bytes")
     mime_type = models.CharField(max_length=124, help_text="The IANA media type of the file")
@@ -113,6 +242,12 @@ class NodeVersion(TimeStampedModel):
         default=FileStatus.UPLOADING,
         db_index=True
     )
+    integrity = models.CharField(
+        max_length=10,
+        choices=IntegrityStatus.choices,
+        default=IntegrityStatus.PENDING,
+        help_text="Whether the checksum was recomputed from the stored blob and matched"
+    )
 
     def save(self, *args, **kwargs):
         if not self.pk:
@@ -133,10 +268,6 @@ class NodeVersion(TimeStampedModel):
                 fields=["node", "version_number"],
                 name="unique_node_version"
             ),
-            models.UniqueConstraint(
-                fields=["storage_provider", "storage_key"],
-                name="unique_file_place"
-            ),
         ]
 
 class StorageUsage(models.Model):
@@ -146,7 +277,34 @@ class StorageUsage(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.used_bytes} bytes"
-    
+
+
+class NodeAccess(models.Model):
+    """
+    Effective-access index mirroring the guardian grants on nodes.
+    A user can reach a node when one of its ancestors (or itself) has a row here,
+    so access checks are a single lookup over the node's ancestor paths.
+    """
+    class AccessLevel(models.TextChoices):
+        VIEWER = "viewer", "Viewer"
+        EDITOR = "editor", "Editor"
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="node_access")
+    node = models.ForeignKey(Node, on_delete=models.CASCADE, related_name="access_entries")
+    level = models.CharField(max_length=6, choices=AccessLevel.choices)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["node", "user", "level"],
+                name="unique_node_access"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.node_id} ({self.level})"
+
 
 class ZipFolder(models.Model):
     class ZipFolderStatus(models.TextChoices):
@@ -158,6 +316,17 @@ class ZipFolder(models.Model):
     node = models.ForeignKey(Node, on_delete=models.SET_NULL, related_name="downloaded_folder", null=True)
     size = models.PositiveBigIntegerField(help_text="Size of the precompressed zipped file in bytes")
     storage_key = models.CharField(max_length=512, unique=True)
+    fingerprint = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        help_text="sha256 of the zipped entries, reused while the folder content is unchanged"
+    )
+    manifest = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Archive name to storage key of every entry, used to rebuild the zip incrementally"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(blank=True, null=True)
     status = models.CharField(max_length=10, choices=ZipFolderStatus.choices, default=ZipFolderStatus.PENDING, db_index=True)
@@ -169,3 +338,8 @@ class ZipFolder(models.Model):
                 super().save(*args, **kwargs)
         else:
             super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["node", "fingerprint", "status"], name="zipfolder_fingerprint_idx"),
+        ]
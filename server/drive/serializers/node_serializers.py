@@ -1,7 +1,11 @@
 from rest_framework import serializers
 from guardian.shortcuts import get_users_with_perms
 from django.contrib.auth.models import User
+from django.db import models
+from django.conf import settings
 from drive.models import Node
+from drive.utils.permissions import filter_editable
+from drive.core.services.node_manager import get_shared_with_bulk
 
 
 class NodeSerializer(serializers.ModelSerializer):
@@ -14,6 +18,25 @@ class SimpleUserSerializer(serializers.ModelSerializer):
         model = User
         fields = ("username", "email")
 
+class NodeDetailsListSerializer(serializers.ListSerializer):
+    """
+    Resolves shares for the whole page up front, so each child reads them
+    from context instead of querying per node.
+    Shares are only listed on nodes the requesting user ("user" in context)
+    can edit; without a user none are listed.
+    """
+
+    def to_representation(self, data):
+        nodes = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        user = self.context.get("user")
+        editable = [] if user is None else filter_editable(user, nodes)
+        self._context = {
+            **self.context,
+            "shared_with": get_shared_with_bulk(editable),
+        }
+        return super().to_representation(nodes)
+
+
 class NodeDetailsSerializer(serializers.ModelSerializer):
     shared_with = serializers.SerializerMethodField()
     owner_email = serializers.ReadOnlyField(source="owner.email")
@@ -23,9 +46,13 @@ class NodeDetailsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Node
         fields = ["name", "type", "owner_email", "version_number", "shared_with", "path"]
+        list_serializer_class = NodeDetailsListSerializer
 
     def get_shared_with(self, obj):
-        user_perms = get_users_with_perms(obj, attach_perms=True)
+        if "shared_with" in self.context:
+            user_perms = self.context["shared_with"].get(obj.pk, {})
+        else:
+            user_perms = get_users_with_perms(obj, attach_perms=True)
         result = []
         for user, perms in user_perms.items():
             user_data = SimpleUserSerializer(user).data
@@ -36,10 +63,13 @@ class NodeDetailsSerializer(serializers.ModelSerializer):
         return result
     
     def get_path(self, obj):
-        ancestors = [item["name"] for item in list(obj.get_ancestors().values("name"))]
-        return "/" + "/".join(ancestors[1:])
+        return obj.parent_display_path
     
 
+class NodeTargetSerializer(serializers.Serializer):
+    target_id = serializers.IntegerField()
+
+
 class NodeShareSerializer(serializers.Serializer):
     access_levels = (
         ("viewer", "Viewer"),
@@ -73,10 +103,41 @@ class InitUploadSerializer(serializers.Serializer):
 
 
 
+class BulkUploadFileSerializer(serializers.Serializer):
+    path = serializers.CharField(max_length=4096, help_text="Path of the file relative to the parent folder")
+    size = serializers.IntegerField(min_value=0)
+    mime_type = serializers.CharField(max_length=124)
+    checksum = serializers.CharField(max_length=64)
+
+    def validate_path(self, value):
+        parts = value.strip("/").split("/")
+        if any(part in ("", ".", "..") or len(part) > 255 for part in parts):
+            raise serializers.ValidationError("invalid relative path")
+        return "/".join(parts)
+
+
+class BulkUploadIntentSerializer(serializers.Serializer):
+    parent_id = serializers.IntegerField(allow_null=True)
+    files = BulkUploadFileSerializer(many=True, allow_empty=False, max_length=settings.DRIVE_UPLOAD_MANIFEST_MAX_FILES)
+
+
 class FinalizeFileUploadSerializer(serializers.Serializer):
     version_id = serializers.IntegerField()
 
 
+class ResumableUploadSerializer(serializers.Serializer):
+    version_id = serializers.IntegerField()
+    action = serializers.ChoiceField(choices=["plan", "commit"])
+
+
+class BulkFinalizeUploadSerializer(serializers.Serializer):
+    version_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.DRIVE_UPLOAD_MANIFEST_MAX_FILES
+    )
+
+
 class UpdateNodeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Node
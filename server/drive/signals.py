@@ -0,0 +1,77 @@
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from guardian.models import UserObjectPermission, GroupObjectPermission
+from drive.models import Node, NodeAccess
+from drive.utils.permissions import PERM_ACCESS_LEVELS, invalidate_permission_cache, sync_node_access
+
+
+def _get_access_level(obj_perm):
+    if obj_perm.content_type_id != ContentType.objects.get_for_model(Node).id:
+        return None
+    return PERM_ACCESS_LEVELS.get(obj_perm.permission.codename)
+
+
+@receiver(post_save, sender=UserObjectPermission)
+def index_node_permission(sender, instance, created, **kwargs):
+    level = _get_access_level(instance)
+    if level is None:
+        return
+    NodeAccess.objects.bulk_create(
+        [NodeAccess(node_id=int(instance.object_pk), user_id=instance.user_id, level=level)],
+        ignore_conflicts=True
+    )
+    invalidate_permission_cache([instance.user_id])
+
+
+@receiver(post_delete, sender=UserObjectPermission)
+def unindex_node_permission(sender, instance, **kwargs):
+    if _get_access_level(instance) is None:
+        return
+    # one of the user's groups may still grant the same level
+    sync_node_access([int(instance.object_pk)], [instance.user_id])
+
+
+@receiver(post_save, sender=GroupObjectPermission)
+def index_group_node_permission(sender, instance, created, **kwargs):
+    level = _get_access_level(instance)
+    if level is None:
+        return
+    member_ids = list(instance.group.user_set.values_list("pk", flat=True))
+    NodeAccess.objects.bulk_create(
+        [NodeAccess(node_id=int(instance.object_pk), user_id=user_id, level=level) for user_id in member_ids],
+        ignore_conflicts=True
+    )
+    invalidate_permission_cache(member_ids)
+
+
+@receiver(pre_delete, sender=GroupObjectPermission)
+def remember_group_members(sender, instance, **kwargs):
+    # deleting a group drops its memberships along with its permissions
+    instance._member_ids = list(instance.group.user_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=GroupObjectPermission)
+def unindex_group_node_permission(sender, instance, **kwargs):
+    if _get_access_level(instance) is None:
+        return
+    sync_node_access([int(instance.object_pk)], getattr(instance, "_member_ids", []))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def reindex_group_members(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        related = instance.user_set if reverse else instance.groups
+        instance._cleared_pks = set(related.values_list("pk", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if action == "post_clear":
+        pk_set = getattr(instance, "_cleared_pks", set())
+    group_ids, user_ids = ({instance.pk}, pk_set) if reverse else (pk_set, {instance.pk})
+    node_ids = GroupObjectPermission.objects.filter(
+        content_type=ContentType.objects.get_for_model(Node),
+        group_id__in=group_ids
+    ).values_list("object_pk", flat=True)
+    sync_node_access({int(pk) for pk in node_ids}, user_ids)
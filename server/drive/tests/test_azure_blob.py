@@ -0,0 +1,155 @@
+import hashlib
+import os
+from types import SimpleNamespace
+from azure.core.exceptions import ResourceNotFoundError
+from datetime import datetime, timedelta, timezone
+from azure.storage.blob import BlobSasPermissions, UserDelegationKey
+from drive.core.services import azure_blob
+
+
+def test_blob_service_is_shared_within_a_process(monkeypatch):
+    created = []
+    monkeypatch.setattr(azure_blob, "_create_blob_service", lambda: created.append(object()) or created[-1])
+    monkeypatch.setattr(azure_blob, "_blob_service_pid", None)
+
+    first = azure_blob.get_blob_service()
+    second = azure_blob.get_blob_service()
+
+    assert first is second
+    assert len(created) == 1
+
+
+def test_blob_service_is_rebuilt_in_a_forked_process(monkeypatch):
+    created = []
+    monkeypatch.setattr(azure_blob, "_create_blob_service", lambda: created.append(object()) or created[-1])
+    monkeypatch.setattr(azure_blob, "_blob_service_pid", None)
+    parent_client = azure_blob.get_blob_service()
+
+    # what a prefork worker sees: the parent's client with the parent's pid
+    monkeypatch.setattr(azure_blob, "_blob_service_pid", os.getpid() + 1)
+
+    assert azure_blob.get_blob_service() is not parent_client
+    assert len(created) == 2
+
+
+def test_transport_uses_configured_pool(settings):
+    settings.DRIVE_BLOB_POOL_MAXSIZE = 17
+
+    transport = azure_blob._build_transport()
+
+    adapter = transport.session.get_adapter("https://account.blob.core.windows.net")
+    assert adapter._pool_maxsize == 17
+
+
+class FakeCredential:
+    account_key = "ZmFrZS1rZXktZm9yLXRlc3Rz"
+
+
+class FakeServiceClient:
+    account_name = "devstoreaccount1"
+    url = "http://127.0.0.1:10000/devstoreaccount1/"
+    credential = FakeCredential()
+
+    def __init__(self):
+        self.delegation_key_requests = 0
+
+    def get_user_delegation_key(self, key_start_time, key_expiry_time):
+        self.delegation_key_requests += 1
+        key = UserDelegationKey()
+        key.signed_oid = key.signed_tid = "00000000-0000-0000-0000-000000000000"
+        key.signed_start = key_start_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+        key.signed_expiry = key_expiry_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+        key.signed_service = "b"
+        key.signed_version = "2021-08-06"
+        key.value = FakeCredential.account_key
+        return key
+
+
+def test_download_urls_are_signed_in_batch(settings, monkeypatch):
+    settings.USE_AZURE_IDENTITY = False
+    calls = []
+    client = FakeServiceClient()
+    monkeypatch.setattr(azure_blob, "get_blob_service", lambda: calls.append(1) or client)
+    monkeypatch.setattr(azure_blob, "_sas_signer", azure_blob.SasSigner())
+
+    urls = azure_blob.generate_download_sas_many(["u/1/a b.txt", "u/1/c.txt"], "zips")
+    azure_blob.generate_download_sas("u/1/d.txt")
+
+    assert urls["u/1/a b.txt"].startswith(f"{client.url}zips/u/1/a%20b.txt?")
+    assert "sp=r" in urls["u/1/c.txt"] and "sig=" in urls["u/1/c.txt"]
+    assert len(calls) == 1
+
+
+def test_delegation_key_is_reused_until_close_to_expiry(settings, monkeypatch):
+    settings.USE_AZURE_IDENTITY = True
+    client = FakeServiceClient()
+    monkeypatch.setattr(azure_blob, "get_blob_service", lambda: client)
+    signer = azure_blob.SasSigner()
+    permissions = BlobSasPermissions(read=True)
+
+    signer.sign_many(["a", "b"], permissions)
+    signer.sign("c", permissions)
+    assert client.delegation_key_requests == 1
+
+    signer._delegation_key_expiry = datetime.now(timezone.utc) + timedelta(minutes=30)
+    signer.sign("d", permissions)
+    assert client.delegation_key_requests == 2
+
+
+class FakePropertiesBlobClient:
+    def __init__(self, size):
+        self.size = size
+
+    def get_blob_properties(self):
+        if self.size is None:
+            raise ResourceNotFoundError("missing")
+        return SimpleNamespace(
+            size=self.size,
+            content_settings=SimpleNamespace(content_type="text/plain", content_md5=None),
+            last_modified=None,
+        )
+
+
+def test_files_metadata_is_fetched_per_blob(monkeypatch):
+    sizes = {"a": 1, "b": None, "c": 3}
+    service = SimpleNamespace(get_blob_client=lambda container, blob: FakePropertiesBlobClient(sizes[blob]))
+    monkeypatch.setattr(azure_blob, "get_blob_service", lambda: service)
+
+    metadata = azure_blob.get_files_metadata(["a", "b", "c"], max_workers=2)
+
+    assert metadata["a"]["size"] == 1
+    assert metadata["b"] == {"status": False, "message": "file not found"}
+    assert metadata["c"]["status"] is True
+
+
+class FakeRangeBlobClient:
+    def __init__(self, data):
+        self.data = data
+        self.reads = []
+
+    def get_blob_properties(self):
+        return SimpleNamespace(size=len(self.data), etag="0x1")
+
+    def download_blob(self, offset, length, etag, match_condition):
+        self.reads.append((offset, length))
+        return SimpleNamespace(readall=lambda: self.data[offset:offset + length])
+
+
+def test_hash_blob_reads_ranges_in_parallel_and_hashes_in_order(monkeypatch):
+    data = bytes(range(256)) * 41
+    blob_client = FakeRangeBlobClient(data)
+    service = SimpleNamespace(get_blob_client=lambda container, blob: blob_client)
+    monkeypatch.setattr(azure_blob, "get_blob_service", lambda: service)
+
+    md5, content_hash = azure_blob.hash_blob("u/1/a.bin", chunk_size=1000, max_workers=3)
+
+    assert md5 == hashlib.md5(data).hexdigest()
+    assert content_hash == hashlib.blake2b(data, digest_size=32).hexdigest()
+    assert sorted(blob_client.reads) == [(offset, min(1000, len(data) - offset)) for offset in range(0, len(data), 1000)]
+
+
+def test_hash_blob_of_missing_blob_is_none(monkeypatch):
+    service = SimpleNamespace(get_blob_client=lambda container, blob: FakePropertiesBlobClient(None))
+    monkeypatch.setattr(azure_blob, "get_blob_service", lambda: service)
+
+    assert azure_blob.hash_blob("u/1/gone.bin") is None
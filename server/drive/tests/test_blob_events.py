@@ -0,0 +1,95 @@
+import hashlib
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from azure.storage.blob import BlobClient, ContentSettings
+from drive.models import Node, StorageUsage
+from drive.core.services.blob_events import get_validation_code, get_created_blob_keys
+
+
+def blob_created_event(storage_key, container="files"):
+    return {
+        "eventType": "Microsoft.Storage.BlobCreated",
+        "subject": f"/blobServices/default/containers/{container}/blobs/{storage_key}",
+        "data": {"api": "PutBlob"},
+    }
+
+
+def test_created_blob_keys_are_read_from_subjects():
+    events = [
+        blob_created_event("u/1/n/2/abc"),
+        blob_created_event("u/1/n/2/abc"),
+        blob_created_event("u/1/n/3/zip.zip", container="zips"),
+        {"eventType": "Microsoft.Storage.BlobDeleted", "subject": "/blobServices/default/containers/files/blobs/x"},
+    ]
+
+    assert get_created_blob_keys(events) == ["u/1/n/2/abc"]
+    assert get_validation_code(events) is None
+
+
+@pytest.mark.django_db
+def test_webhook_requires_secret(api_client, settings):
+    settings.DRIVE_BLOB_EVENTS_SECRET = "s3cret"
+    url = reverse("blob-events")
+
+    assert api_client.post(url, [], format="json").status_code == status.HTTP_404_NOT_FOUND
+    assert api_client.post(f"{url}?code=wrong", [], format="json").status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_webhook_answers_subscription_validation(api_client, settings):
+    settings.DRIVE_BLOB_EVENTS_SECRET = "s3cret"
+    events = [{
+        "eventType": "Microsoft.EventGrid.SubscriptionValidationEvent",
+        "data": {"validationCode": "512d38b6-c7b8-40c8-89fe-f46f9e9622b6"},
+    }]
+
+    response = api_client.post(f"{reverse('blob-events')}?code=s3cret", events, format="json")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data == {"validationResponse": "512d38b6-c7b8-40c8-89fe-f46f9e9622b6"}
+
+
+@pytest.mark.django_db
+def test_blob_created_event_finalizes_upload(api_client, user, root_folder, settings):
+    settings.DRIVE_BLOB_EVENTS_SECRET = "s3cret"
+    content = b"uploaded without finalize"
+    api_client.force_authenticate(user=user)
+    intent = api_client.post(
+        reverse("init-upload"),
+        {
+            "filename": "event.txt",
+            "size": len(content),
+            "mime_type": "text/plain",
+            "checksum": hashlib.md5(content).hexdigest(),
+            "parent_id": root_folder.id,
+        },
+        format="json",
+    ).data
+    BlobClient.from_blob_url(intent["upload_url"]).upload_blob(
+        content, overwrite=True, content_settings=ContentSettings(content_type="text/plain")
+    )
+    storage_key = Node.objects.get(pk=intent["node_id"]).versions.get().storage_key
+    api_client.force_authenticate(user=None)
+
+    response = api_client.post(
+        f"{reverse('blob-events')}?code=s3cret", [blob_created_event(storage_key)], format="json"
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    node = Node.objects.get(pk=intent["node_id"])
+    assert node.status == Node.NodeStatus.ACTIVE
+    assert node.current_version_id == intent["version_id"]
+    assert StorageUsage.objects.get(user=user).used_bytes == len(content)
+
+    # the client finalizing afterwards gets a success, without a second charge
+    api_client.force_authenticate(user=user)
+    response = api_client.post(
+        reverse("finalize-upload", kwargs={"node_id": intent["node_id"]}),
+        {"version_id": intent["version_id"]},
+        format="json",
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.data["filename"] == "event.txt"
+    assert StorageUsage.objects.get(user=user).used_bytes == len(content)
@@ -0,0 +1,102 @@
+import hashlib
+import pytest
+from datetime import timedelta
+from django.utils import timezone
+from drive.core import tasks
+from drive.core.services import node_manager
+from drive.models import Node, NodeVersion, StoredBlob
+
+CONTENT = b"syllabus"
+MD5 = hashlib.md5(CONTENT).hexdigest()
+BLAKE = hashlib.blake2b(CONTENT, digest_size=32).hexdigest()
+
+
+def finalized_version(user, parent, name, checksum, blob):
+    node = parent.add_child(name=name, owner=user, type=Node.NodeType.file, status=Node.NodeStatus.ACTIVE)
+    return NodeVersion.objects.create(
+        node=node,
+        storage_key=blob.storage_key,
+        blob=blob,
+        size=blob.size,
+        mime_type="text/plain",
+        checksum=checksum,
+        status=NodeVersion.FileStatus.ACTIVE,
+    )
+
+
+@pytest.fixture
+def hashed_blobs(monkeypatch):
+    reads = []
+
+    def fake_hash_blob(storage_key):
+        reads.append(storage_key)
+        return MD5, BLAKE
+
+    monkeypatch.setattr(node_manager, "hash_blob", fake_hash_blob)
+    return reads
+
+
+@pytest.mark.django_db
+def test_versions_are_checked_against_the_stored_content(user, root_folder, hashed_blobs):
+    blob = StoredBlob.objects.create(storage_key="u/1/n/1", checksum=MD5, size=len(CONTENT), ref_count=2)
+    honest = finalized_version(user, root_folder, "a.txt", MD5.upper(), blob)
+    lying = finalized_version(user, root_folder, "b.txt", "0" * 32, blob)
+
+    result = node_manager.verify_uploaded_blobs([honest.pk, lying.pk])
+
+    assert result == {"verified": 1, "mismatch": 1}
+    assert hashed_blobs == ["u/1/n/1"]
+    honest.refresh_from_db()
+    lying.refresh_from_db()
+    assert honest.integrity == NodeVersion.IntegrityStatus.VERIFIED
+    assert lying.integrity == NodeVersion.IntegrityStatus.MISMATCH
+    blob.refresh_from_db()
+    assert blob.verified
+    assert blob.content_hash == BLAKE
+
+
+@pytest.mark.django_db
+def test_duplicate_content_keeps_the_first_verified_blob(user, root_folder, hashed_blobs):
+    StoredBlob.objects.create(storage_key="u/1/n/1", checksum=MD5, size=len(CONTENT), verified=True)
+    late = StoredBlob.objects.create(storage_key="u/1/n/2", checksum=MD5, size=len(CONTENT), ref_count=1)
+    version = finalized_version(user, root_folder, "copy.txt", MD5, late)
+
+    assert node_manager.verify_uploaded_blobs([version.pk]) == {"verified": 1}
+
+    late.refresh_from_db()
+    assert not late.verified
+    assert late.content_hash == BLAKE
+
+
+@pytest.mark.django_db
+def test_verified_blobs_are_not_read_again(user, root_folder, hashed_blobs):
+    blob = StoredBlob.objects.create(storage_key="u/1/n/1", checksum=MD5, size=len(CONTENT), verified=True)
+    version = finalized_version(user, root_folder, "a.txt", MD5, blob)
+
+    node_manager.verify_uploaded_blobs([version.pk])
+
+    assert hashed_blobs == []
+    version.refresh_from_db()
+    assert version.integrity == NodeVersion.IntegrityStatus.VERIFIED
+
+
+@pytest.mark.django_db
+def test_blobs_open_to_upload_urls_are_sealed_later(user, root_folder, hashed_blobs):
+    blob = StoredBlob.objects.create(
+        storage_key="u/1/n/1", checksum=MD5, size=len(CONTENT), ref_count=1,
+        writable_until=timezone.now() + timedelta(minutes=10)
+    )
+    version = finalized_version(user, root_folder, "a.txt", MD5, blob)
+
+    # the upload is checked at completion, the blob is not offered yet
+    assert node_manager.verify_uploaded_blobs([version.pk]) == {"verified": 1}
+    assert not StoredBlob.objects.get(pk=blob.pk).verified
+    assert tasks.verify_pending_uploads_task() == {}
+
+    StoredBlob.objects.filter(pk=blob.pk).update(writable_until=timezone.now() - timedelta(minutes=1))
+
+    assert tasks.verify_pending_uploads_task() == {"sealed": 1}
+    assert StoredBlob.objects.get(pk=blob.pk).verified
+    assert hashed_blobs == ["u/1/n/1", "u/1/n/1"]
+    version.refresh_from_db()
+    assert version.integrity == NodeVersion.IntegrityStatus.VERIFIED
@@ -0,0 +1,63 @@
+import random
+import threading
+import time
+import pytest
+from drive.core.services.azure_blob import AzureBlockStreamer
+
+
+class FakeBlockBlobClient:
+    def __init__(self, fail_on=None):
+        self.staged = {}
+        self.committed = None
+        self.fail_on = fail_on
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def stage_block(self, block_id, data, length=None):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(random.uniform(0, 0.005))
+            if block_id == self.fail_on:
+                raise IOError("stage failed")
+            self.staged[block_id] = bytes(data[:length])
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def commit_block_list(self, block_list):
+        self.committed = b"".join(self.staged[block.id] for block in block_list)
+
+
+def test_blocks_are_committed_in_write_order():
+    client = FakeBlockBlobClient()
+    streamer = AzureBlockStreamer(client, block_size=1000, max_concurrency=3)
+    payload = bytes(random.getrandbits(8) for _ in range(25_500))
+
+    offset = 0
+    while offset < len(payload):
+        step = random.randint(1, 2500)
+        assert streamer.write(payload[offset:offset + step]) == len(payload[offset:offset + step])
+        offset += step
+    assert streamer.tell() == len(payload)
+    streamer.finalize()
+
+    assert client.committed == payload
+    assert len(streamer.block_ids) == 26
+    assert len({len(block.id) for block in streamer.block_ids}) == 1
+    assert client.max_in_flight <= 3
+
+
+def test_staging_error_is_raised_and_nothing_committed():
+    client = FakeBlockBlobClient(fail_on=f"{1:032d}")
+    streamer = AzureBlockStreamer(client, block_size=100, max_concurrency=2)
+
+    with pytest.raises(IOError):
+        for _ in range(20):
+            streamer.write(b"x" * 100)
+        streamer.finalize()
+
+    streamer.close()
+    assert client.committed is None
@@ -0,0 +1,106 @@
+import hashlib
+import pytest
+from django.urls import reverse
+from azure.storage.blob import BlobClient, ContentSettings
+from drive.models import Node, NodeVersion, StorageUsage
+
+
+def manifest_entry(path, content=b"content"):
+    return {
+        "path": path,
+        "size": len(content),
+        "mime_type": "text/plain",
+        "checksum": hashlib.md5(content).hexdigest(),
+    }
+
+
+@pytest.mark.django_db
+def test_bulk_upload_intent_creates_tree(api_client, user, root_folder):
+    existing = root_folder.add_child(
+        name="existing.txt",
+        owner=user,
+        type=Node.NodeType.file,
+        status=Node.NodeStatus.ACTIVE,
+    )
+    api_client.force_authenticate(user=user)
+
+    payload = {
+        "parent_id": root_folder.id,
+        "files": [
+            manifest_entry("course/week2/b.txt"),
+            manifest_entry("course/week1/a.txt"),
+            manifest_entry("course/syllabus.pdf"),
+            manifest_entry("loose.txt"),
+        ],
+    }
+    response = api_client.post(reverse("bulk-init-upload"), payload, format="json")
+
+    assert response.status_code == 200
+    assert [f["path"] for f in response.data["folders"]] == ["course", "course/week1", "course/week2"]
+    assert sorted(f["path"] for f in response.data["files"]) == sorted(e["path"] for e in payload["files"])
+    assert all(f["upload_url"].startswith("http") for f in response.data["files"])
+
+    assert Node.find_problems() == ([], [], [], [], [])
+    root_folder.refresh_from_db()
+    assert [n.name for n in root_folder.get_children()] == ["course", "existing.txt", "loose.txt"]
+
+    course = Node.objects.get(name="course")
+    assert [n.name for n in course.get_children()] == ["syllabus.pdf", "week1", "week2"]
+    b_file = Node.objects.get(name="b.txt")
+    assert b_file.status == Node.NodeStatus.UPLOADING
+    assert b_file.display_path == f"{root_folder.display_path.rstrip('/')}/course/week2/b.txt"
+    assert NodeVersion.objects.filter(node__owner=user, version_number=1).count() == 4
+
+    # the tree stays usable for regular inserts
+    course.add_child(name="intro.txt", owner=user, type=Node.NodeType.file, status=Node.NodeStatus.ACTIVE)
+    assert Node.find_problems() == ([], [], [], [], [])
+    existing.refresh_from_db()
+    assert existing.get_parent() == root_folder
+
+
+@pytest.mark.django_db
+def test_bulk_upload_intent_rejects_bad_paths(api_client, user, root_folder):
+    api_client.force_authenticate(user=user)
+
+    for files in ([manifest_entry("a/../b.txt")], [manifest_entry("a.txt"), manifest_entry("a.txt")]):
+        response = api_client.post(
+            reverse("bulk-init-upload"),
+            {"parent_id": root_folder.id, "files": files},
+            format="json",
+        )
+        assert response.status_code == 400
+
+    assert root_folder.get_children_count() == 0
+
+
+@pytest.mark.django_db
+def test_bulk_finalize_activates_uploaded_files(api_client, user, root_folder):
+    api_client.force_authenticate(user=user)
+    contents = {"a.txt": b"first file", "b.txt": b"second file", "c.txt": b"never uploaded"}
+    response = api_client.post(
+        reverse("bulk-init-upload"),
+        {"parent_id": root_folder.id, "files": [manifest_entry(p, c) for p, c in contents.items()]},
+        format="json",
+    )
+    files = {f["path"]: f for f in response.data["files"]}
+
+    for path in ("a.txt", "b.txt"):
+        data = contents[path] if path == "a.txt" else b"truncated"
+        BlobClient.from_blob_url(files[path]["upload_url"]).upload_blob(
+            data, overwrite=True, content_settings=ContentSettings(content_type="text/plain")
+        )
+
+    version_ids = [f["version_id"] for f in files.values()]
+    response = api_client.post(reverse("bulk-finalize-upload"), {"version_ids": version_ids}, format="json")
+
+    assert response.status_code == 200
+    assert [f["filename"] for f in response.data["finalized"]] == ["a.txt"]
+    assert {f["version_id"] for f in response.data["failed"]} == {files["b.txt"]["version_id"], files["c.txt"]["version_id"]}
+    assert StorageUsage.objects.get(user=user).used_bytes == len(contents["a.txt"])
+    assert Node.objects.get(pk=files["a.txt"]["node_id"]).status == Node.NodeStatus.ACTIVE
+    assert Node.objects.get(pk=files["c.txt"]["node_id"]).status == Node.NodeStatus.DRAFT
+
+    # finalizing again does not count the bytes twice
+    again = api_client.post(reverse("bulk-finalize-upload"), {"version_ids": version_ids}, format="json")
+    assert again.data["finalized"] == []
+    assert StorageUsage.objects.get(user=user).used_bytes == len(contents["a.txt"])
@@ -2,9 +2,14 @@ import pytest
 from django.urls import reverse
 from rest_framework import status
 from drive.models import Node, NodeVersion, ZipFolder
+from drive.core.services.node_manager import get_files_info
+from drive.core.services.redis_cache import redis_client, ZIP_INFLIGHT_KEY, is_task_owner
+from django.contrib.auth.models import User
 import hashlib
 import uuid
 import time
+import io
+import zipfile
 
 def upload_dummy_blob(container, storage_key: str, content: bytes):
     blob_client = container.get_blob_client(storage_key)
@@ -256,3 +261,121 @@ def test_cannot_download_trashed_node(user, api_client, root_folder):
 
     assert response.status_code == status.HTTP_404_NOT_FOUND
 
+
+
+@pytest.mark.django_db
+def test_unchanged_folder_reuses_completed_zip(
+    user,
+    api_client,
+    file_node_with_blob,
+):
+    folder = file_node_with_blob
+    api_client.force_authenticate(user)
+    url = reverse("download-node", args=[folder.id])
+
+    first = api_client.get(url)
+    assert_zip_task_response(first.data)
+    assert ZipFolder.objects.get(node=folder.id).status == ZipFolder.ZipFolderStatus.COMPLETED
+
+    second = api_client.get(url)
+
+    assert_download_file_response(second.data, expected_filename=folder.name)
+    assert ZipFolder.objects.filter(node=folder.id).count() == 1
+
+
+@pytest.mark.django_db
+def test_changed_folder_builds_new_zip(
+    user,
+    api_client,
+    create_container,
+    file_node_with_blob,
+):
+    folder = file_node_with_blob
+    api_client.force_authenticate(user)
+    url = reverse("download-node", args=[folder.id])
+
+    api_client.get(url)
+    create_file_node(
+        parent=folder,
+        owner=user,
+        name="file5.txt",
+        status=Node.NodeStatus.ACTIVE,
+        container=create_container,
+        content=b"new content",
+        mime_type="text/plain",
+    )
+    folder.refresh_from_db()
+
+    response = api_client.get(url)
+
+    assert_zip_task_response(response.data)
+    assert ZipFolder.objects.filter(node=folder.id).count() == 2
+    assert len(set(ZipFolder.objects.values_list("fingerprint", flat=True))) == 2
+
+
+@pytest.mark.django_db
+def test_concurrent_download_joins_running_zip_task(
+    user,
+    api_client,
+    file_node_with_blob,
+):
+    folder = file_node_with_blob
+    _, _, fingerprint = get_files_info(folder)
+    inflight_key = f"{ZIP_INFLIGHT_KEY}:{folder.id}:{fingerprint}"
+    redis_client.set(inflight_key, "running-task-id", ex=60)
+
+    student = User.objects.create_user(
+        username="student",
+        email="student@test.com",
+        password="StrongPass123!",
+    )
+    folder.is_public = True
+    folder.save()
+
+    try:
+        for requester in (user, student):
+            api_client.force_authenticate(requester)
+            response = api_client.get(reverse("download-node", args=[folder.id]))
+            assert response.data["task_id"] == "running-task-id"
+    finally:
+        redis_client.delete(inflight_key)
+
+    assert not ZipFolder.objects.filter(node=folder.id).exists()
+    assert is_task_owner("running-task-id", user.id)
+    assert is_task_owner("running-task-id", student.id)
+
+
+@pytest.mark.django_db
+def test_zip_task_releases_inflight_lock(user, api_client, file_node_with_blob):
+    folder = file_node_with_blob
+    api_client.force_authenticate(user)
+
+    api_client.get(reverse("download-node", args=[folder.id]))
+
+    _, _, fingerprint = get_files_info(folder)
+    assert redis_client.get(f"{ZIP_INFLIGHT_KEY}:{folder.id}:{fingerprint}") is None
+
+
+@pytest.mark.django_db
+def test_stream_small_folder_as_zip(user, api_client, file_node_with_blob):
+    folder = file_node_with_blob
+    api_client.force_authenticate(user)
+
+    response = api_client.get(reverse("stream-node-zip", args=[folder.id]))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response["Content-Type"] == "application/zip"
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+    assert sorted(archive.namelist()) == ["child_folder/file3.txt", "file1.txt"]
+    assert archive.read("file1.txt") == b"primary content"
+    assert not ZipFolder.objects.exists()
+
+
+@pytest.mark.django_db
+def test_stream_rejects_large_folder(user, api_client, file_node_with_blob, settings):
+    settings.DRIVE_ZIP_STREAM_MAX_BYTES = 10
+    api_client.force_authenticate(user)
+
+    response = api_client.get(reverse("stream-node-zip", args=[file_node_with_blob.id]))
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -163,3 +163,53 @@ def test_list_nodes_response_schema(api_client, user, create_nodes):
 
     assert set(node.keys()) == {"id", "name", "type", "owner"}
     assert node["type"] in {"file", "folder"}
+
+
+@pytest.mark.django_db
+def test_list_nodes_returns_single_page(api_client, user, root_folder):
+    for i in range(25):
+        root_folder.add_child(
+            name=f"file {i:02d}",
+            owner=user,
+            type=Node.NodeType.file,
+            status=Node.NodeStatus.ACTIVE,
+        )
+
+    api_client.force_authenticate(user=user)
+
+    url = reverse("node-list")
+    response = api_client.get(url, {"parent_id": root_folder.id})
+
+    assert response.data["count"] == 25
+    assert len(response.data["results"]) == 20
+
+
+@pytest.mark.django_db
+def test_list_nodes_cursor_pagination(api_client, user, root_folder):
+    for i in range(25):
+        root_folder.add_child(
+            name=f"file {i:02d}",
+            owner=user,
+            type=Node.NodeType.file,
+            status=Node.NodeStatus.ACTIVE,
+        )
+
+    api_client.force_authenticate(user=user)
+
+    url = reverse("node-list")
+    first_page = api_client.get(
+        url, {"parent_id": root_folder.id, "pagination": "cursor", "page_size": 10}
+    )
+
+    assert first_page.status_code == status.HTTP_200_OK
+    names = [n["name"] for n in first_page.data["results"]]
+    assert names == [f"file {i:02d}" for i in range(10)]
+
+    next_url = first_page.data["next"]
+    seen = list(names)
+    while next_url:
+        page = api_client.get(next_url)
+        seen.extend(n["name"] for n in page.data["results"])
+        next_url = page.data["next"]
+
+    assert seen == [f"file {i:02d}" for i in range(25)]
@@ -56,7 +56,7 @@ def test_list_shared_nodes(api_client, user, root_folder, create_shared_node):
     response = api_client.get(url)
 
     assert response.status_code == status.HTTP_200_OK
-    returned_ids = {n["id"] for n in response.data}
+    returned_ids = {n["id"] for n in response.data["results"]}
     assert shared_node.id in returned_ids
 
 
@@ -81,7 +81,7 @@ def test_only_shared_nodes_returned(api_client, user, root_folder, create_shared
     url = reverse("node-shared")
     response = api_client.get(url)
 
-    returned_ids = {n["id"] for n in response.data}
+    returned_ids = {n["id"] for n in response.data["results"]}
 
     assert shared_node.id in returned_ids
     assert private_node.id not in returned_ids
@@ -112,7 +112,7 @@ def test_shared_nodes_excludes_inactive(api_client, user, root_folder):
     url = reverse("node-shared")
     response = api_client.get(url)
 
-    returned_ids = {n["id"] for n in response.data}
+    returned_ids = {n["id"] for n in response.data["results"]}
 
     assert inactive_node.id not in returned_ids
 
@@ -128,7 +128,7 @@ def test_no_shared_nodes_returns_empty_list(api_client, user):
     response = api_client.get(url)
 
     assert response.status_code == status.HTTP_200_OK
-    assert response.data == []
+    assert response.data["results"] == []
 
 
 @pytest.mark.django_db
@@ -168,9 +168,9 @@ def test_owner_files_not_returned(api_client, user, root_folder, create_shared_n
     url = reverse("node-shared")
     response = api_client.get(url)
     assert response.status_code == status.HTTP_200_OK
-    assert len(response.data) > 0
+    assert len(response.data["results"]) > 0
 
-    returned_ids = {n["id"] for n in response.data}
+    returned_ids = {n["id"] for n in response.data["results"]}
 
     assert myfile.id not in returned_ids
 
@@ -208,7 +208,54 @@ def test_shared_nodes_response_schema(api_client, user):
 
     assert response.status_code == status.HTTP_200_OK
 
-    returned_node = response.data[0]
+    returned_node = response.data["results"][0]
 
     assert set(returned_node.keys()) == {"id", "name", "type", "owner"}
     assert returned_node["type"] in {"file", "folder"}
+
+
+@pytest.mark.django_db
+def test_nested_shares_collapse_to_top_level(api_client, user, root_folder, create_shared_node):
+    friend = User.objects.create_user(
+        username="friend",
+        email="friend@test.com",
+        password="StrongPass123!",
+    )
+
+    course = create_shared_node(user, root_folder, "course", Node.NodeType.folder)
+    week = create_shared_node(user, course, "week1", Node.NodeType.folder)
+    notes = create_shared_node(user, week, "notes.txt")
+
+    assign_perm("view_node", friend, course)
+    assign_perm("view_node", friend, notes)
+
+    api_client.force_authenticate(user=friend)
+
+    response = api_client.get(reverse("node-shared"))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["count"] == 1
+    assert [n["id"] for n in response.data["results"]] == [course.id]
+
+
+@pytest.mark.django_db
+def test_shared_nodes_are_paginated(api_client, user, root_folder, create_shared_node):
+    friend = User.objects.create_user(
+        username="friend",
+        email="friend@test.com",
+        password="StrongPass123!",
+    )
+
+    for i in range(25):
+        node = create_shared_node(user, root_folder, f"Shared {i:02d}")
+        assign_perm("view_node", friend, node)
+
+    api_client.force_authenticate(user=friend)
+
+    url = reverse("node-shared")
+    first_page = api_client.get(url)
+    second_page = api_client.get(url, {"page": 2})
+
+    assert first_page.data["count"] == 25
+    assert len(first_page.data["results"]) == 20
+    assert len(second_page.data["results"]) == 5
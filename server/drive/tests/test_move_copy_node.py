@@ -0,0 +1,188 @@
+import pytest
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from drive.core.services import node_manager
+from drive.models import Node, NodeVersion, StoredBlob, StorageUsage
+
+
+def add_folder(user, parent, name):
+    return parent.add_child(name=name, owner=user, type=Node.NodeType.folder, status=Node.NodeStatus.ACTIVE)
+
+
+def add_file(user, parent, name, size=10):
+    node = parent.add_child(name=name, owner=user, type=Node.NodeType.file, status=Node.NodeStatus.ACTIVE)
+    blob = StoredBlob.objects.create(storage_key=f"u/{user.pk}/n/{node.pk}", checksum="0" * 32, size=size, ref_count=1)
+    version = NodeVersion.objects.create(
+        node=node,
+        storage_key=blob.storage_key,
+        blob=blob,
+        size=size,
+        mime_type="text/plain",
+        checksum=blob.checksum,
+        status=NodeVersion.FileStatus.ACTIVE,
+    )
+    node.current_version = version
+    node.save()
+    return node
+
+
+@pytest.fixture
+def semester(user, root_folder):
+    """
+    root/
+    ├── archive/
+    └── semester/
+        ├── week1/
+        │   └── notes.txt
+        └── syllabus.pdf
+    """
+    archive = add_folder(user, root_folder, "archive")
+    semester = add_folder(user, root_folder, "semester")
+    week = add_folder(user, semester, "week1")
+    add_file(user, week, "notes.txt")
+    add_file(user, semester, "syllabus.pdf", size=25)
+    return archive, semester
+
+
+@pytest.mark.django_db
+def test_move_rewrites_the_subtree(api_client, user, root_folder, semester, django_assert_max_num_queries):
+    archive, semester = semester
+    api_client.force_authenticate(user=user)
+
+    with django_assert_max_num_queries(15):
+        response = api_client.post(reverse("node-move", args=[semester.id]), {"target_id": archive.id}, format="json")
+
+    assert response.status_code == 200
+    assert Node.find_problems() == ([], [], [], [], [])
+    notes = Node.objects.get(name="notes.txt")
+    assert notes.get_parent().get_parent().get_parent() == archive
+    assert notes.display_path == f"{archive.display_path}/semester/week1/notes.txt"
+    root_folder.refresh_from_db()
+    archive.refresh_from_db()
+    assert root_folder.numchild == 1
+    assert [n.name for n in archive.get_children()] == ["semester"]
+
+
+@pytest.mark.django_db
+def test_move_keeps_siblings_in_name_order(api_client, user, root_folder, semester):
+    archive, semester = semester
+    add_file(user, archive, "b.txt")
+    add_file(user, archive, "c.txt")
+    a_file = add_file(user, semester, "a.txt")
+    api_client.force_authenticate(user=user)
+
+    response = api_client.post(reverse("node-move", args=[a_file.id]), {"target_id": archive.id}, format="json")
+
+    assert response.status_code == 200
+    assert Node.find_problems() == ([], [], [], [], [])
+    assert [n.name for n in archive.get_children()] == ["a.txt", "b.txt", "c.txt"]
+    assert [n.name for n in semester.get_children()] == ["syllabus.pdf", "week1"]
+
+
+@pytest.mark.django_db
+def test_move_into_own_subtree_is_rejected(api_client, user, semester):
+    _, semester = semester
+    week = Node.objects.get(name="week1")
+    api_client.force_authenticate(user=user)
+
+    response = api_client.post(reverse("node-move", args=[semester.id]), {"target_id": week.id}, format="json")
+
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_move_needs_edit_access(api_client, semester):
+    archive, semester = semester
+    stranger = User.objects.create_user(username="bob", email="bob@test.com", password="StrongPass123!")
+    api_client.force_authenticate(user=stranger)
+
+    response = api_client.post(reverse("node-move", args=[semester.id]), {"target_id": archive.id}, format="json")
+
+    assert response.status_code == 403
+
+
+@pytest.mark.django_db
+def test_copy_shares_blobs(api_client, user, root_folder, semester):
+    archive, semester = semester
+    add_folder(user, archive, "2024")
+    api_client.force_authenticate(user=user)
+
+    response = api_client.post(reverse("node-copy", args=[semester.id]), {"target_id": archive.id}, format="json")
+
+    assert response.status_code == 201
+    assert Node.find_problems() == ([], [], [], [], [])
+    copy = Node.objects.get(pk=response.data["id"])
+    assert [n.name for n in archive.get_children()] == ["2024", "semester"]
+    assert [n.display_path for n in copy.get_descendants()] == [
+        f"{archive.display_path}/semester/syllabus.pdf",
+        f"{archive.display_path}/semester/week1",
+        f"{archive.display_path}/semester/week1/notes.txt",
+    ]
+
+    copied_notes = copy.get_descendants().get(name="notes.txt")
+    original_notes = semester.get_descendants().get(name="notes.txt")
+    assert copied_notes.current_version.storage_key == original_notes.current_version.storage_key
+    assert StoredBlob.objects.get(storage_key=original_notes.current_version.storage_key).ref_count == 2
+    assert StorageUsage.objects.get(user=user).used_bytes == 35
+
+    # the original stays where it was
+    semester.refresh_from_db()
+    assert semester.get_descendant_count() == 3
+
+
+@pytest.mark.django_db
+def test_copy_does_not_share_blobs_open_to_upload_urls(
+    api_client, user, semester, monkeypatch, django_capture_on_commit_callbacks
+):
+    archive, semester = semester
+    syllabus = Node.objects.get(name="syllabus.pdf")
+    writable = syllabus.current_version.blob
+    StoredBlob.objects.filter(pk=writable.pk).update(writable_until=timezone.now() + timedelta(minutes=10))
+    copied_blobs = []
+    monkeypatch.setattr(node_manager, "start_blob_copy", lambda source, target: copied_blobs.append((source, target)) or True)
+    monkeypatch.setattr(node_manager, "get_files_metadata", lambda keys: {
+        key: {"status": True, "size": 25, "type": "text/plain", "content_md5": None} for key in keys
+    })
+    api_client.force_authenticate(user=user)
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        response = api_client.post(reverse("node-copy", args=[semester.id]), {"target_id": archive.id}, format="json")
+
+    assert response.status_code == 201
+    copy = Node.objects.get(pk=response.data["id"])
+    copied_syllabus = copy.get_descendants().get(name="syllabus.pdf")
+    copied_version = copied_syllabus.versions.get()
+    assert copied_syllabus.status == Node.NodeStatus.UPLOADING
+    assert copied_version.blob.storage_key == copied_version.storage_key != writable.storage_key
+    assert copied_version.blob.ref_count == 1
+    assert StoredBlob.objects.get(pk=writable.pk).ref_count == 1
+    # blobs past their upload window are still shared
+    assert copy.get_descendants().get(name="notes.txt").current_version.blob.ref_count == 2
+    assert StorageUsage.objects.get(user=user).used_bytes == 10
+
+    # the content is copied once the copy is committed
+    for callback in callbacks:
+        callback()
+
+    assert copied_blobs == [(writable.storage_key, copied_version.storage_key)]
+    copied_syllabus.refresh_from_db()
+    assert copied_syllabus.status == Node.NodeStatus.ACTIVE
+    assert copied_syllabus.current_version_id == copied_version.pk
+    assert StorageUsage.objects.get(user=user).used_bytes == 35
+
+
+@pytest.mark.django_db
+def test_copy_quota_counts_only_copied_files(api_client, user, semester, settings):
+    archive, semester = semester
+    Node.objects.filter(name="week1").update(status=Node.NodeStatus.DRAFT)
+    settings.DRIVE_STORAGE_QUOTA_BYTES = 25
+    api_client.force_authenticate(user=user)
+
+    response = api_client.post(reverse("node-copy", args=[semester.id]), {"target_id": archive.id}, format="json")
+
+    assert response.status_code == 201
+    copy = Node.objects.get(pk=response.data["id"])
+    assert [n.name for n in copy.get_descendants()] == ["syllabus.pdf"]
+    assert StorageUsage.objects.get(user=user).used_bytes == 25
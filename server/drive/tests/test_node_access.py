@@ -0,0 +1,203 @@
+import pytest
+from django.contrib.auth.models import User, Group
+from django.urls import reverse
+from guardian.shortcuts import assign_perm, remove_perm
+from drive.models import Node, NodeAccess
+from drive.utils.permissions import can_view, can_edit, permission_cache, get_accessible_path_filter
+
+
+@pytest.fixture
+def friend():
+    return User.objects.create_user(
+        username="friend",
+        email="friend@test.com",
+        password="StrongPass123!",
+    )
+
+
+@pytest.fixture
+def nested_folder(user, root_folder):
+    """
+    root/
+    └── course/
+        └── week1/
+            └── notes.txt
+    """
+    course = root_folder.add_child(
+        name="course",
+        owner=user,
+        type=Node.NodeType.folder,
+        status=Node.NodeStatus.ACTIVE,
+    )
+    week = course.add_child(
+        name="week1",
+        owner=user,
+        type=Node.NodeType.folder,
+        status=Node.NodeStatus.ACTIVE,
+    )
+    notes = week.add_child(
+        name="notes.txt",
+        owner=user,
+        type=Node.NodeType.file,
+        status=Node.NodeStatus.ACTIVE,
+    )
+    return course, week, notes
+
+
+@pytest.mark.django_db
+def test_share_endpoint_indexes_access(api_client, user, friend, nested_folder):
+    course, _, _ = nested_folder
+    api_client.force_authenticate(user=user)
+
+    url = reverse("node-share", args=[course.id])
+    response = api_client.post(
+        url,
+        {"emails": [friend.email], "access_level": "editor"},
+        format="json",
+    )
+
+    assert response.status_code == 201
+    assert NodeAccess.objects.filter(
+        user=friend, node=course, level=NodeAccess.AccessLevel.EDITOR
+    ).exists()
+
+
+@pytest.mark.django_db
+def test_access_is_inherited_by_descendants(friend, nested_folder):
+    course, week, notes = nested_folder
+
+    assign_perm("drive.view_node", friend, week)
+
+    assert can_view(friend, notes)
+    assert can_view(friend, week)
+    assert not can_view(friend, course)
+    assert not can_edit(friend, notes)
+
+
+@pytest.mark.django_db
+def test_editor_can_view(friend, nested_folder):
+    course, _, notes = nested_folder
+
+    assign_perm("drive.edit_node", friend, course)
+
+    assert can_edit(friend, notes)
+    assert can_view(friend, notes)
+
+
+@pytest.mark.django_db
+def test_removing_permission_revokes_access(friend, nested_folder):
+    course, _, notes = nested_folder
+
+    assign_perm("drive.view_node", friend, course)
+    assert can_view(friend, notes)
+
+    remove_perm("drive.view_node", friend, course)
+
+    assert not NodeAccess.objects.filter(user=friend).exists()
+    assert not can_view(friend, notes)
+
+
+@pytest.mark.django_db
+def test_access_survives_sibling_reordering(user, friend, nested_folder):
+    course, week, notes = nested_folder
+    assign_perm("drive.view_node", friend, week)
+
+    # sorted insertion shifts the paths of "week1" and its subtree
+    course.add_child(
+        name="intro",
+        owner=user,
+        type=Node.NodeType.folder,
+        status=Node.NodeStatus.ACTIVE,
+    )
+    notes.refresh_from_db()
+
+    assert can_view(friend, notes)
+
+
+@pytest.mark.django_db
+def test_permission_cache_reuses_loaded_grants(friend, nested_folder, django_assert_num_queries):
+    course, week, notes = nested_folder
+    assign_perm("drive.view_node", friend, course)
+
+    with permission_cache():
+        with django_assert_num_queries(1):
+            assert can_view(friend, notes)
+            assert can_view(friend, week)
+            assert not can_edit(friend, notes)
+
+
+@pytest.mark.django_db
+def test_permission_cache_sees_new_grants(friend, nested_folder):
+    course, _, notes = nested_folder
+
+    with permission_cache():
+        assert not can_view(friend, notes)
+        assign_perm("drive.view_node", friend, course)
+        assert can_view(friend, notes)
+
+
+@pytest.mark.django_db
+def test_accessible_path_filter_covers_shared_subtrees(user, friend, root_folder, nested_folder):
+    course, week, notes = nested_folder
+    private = root_folder.add_child(
+        name="private.txt",
+        owner=user,
+        type=Node.NodeType.file,
+        status=Node.NodeStatus.ACTIVE,
+    )
+    public = root_folder.add_child(
+        name="public.txt",
+        owner=user,
+        type=Node.NodeType.file,
+        status=Node.NodeStatus.ACTIVE,
+        is_public=True,
+    )
+    own = Node.add_root(
+        owner=friend,
+        name="mine",
+        type=Node.NodeType.folder,
+        status=Node.NodeStatus.ACTIVE,
+    )
+
+    # nested grants must not duplicate rows
+    assign_perm("drive.view_node", friend, course)
+    assign_perm("drive.view_node", friend, week)
+
+    visible = list(
+        Node.active_objects.filter(get_accessible_path_filter(friend)).values_list("id", flat=True)
+    )
+
+    assert sorted(visible) == sorted([course.id, week.id, notes.id, public.id, own.id])
+    assert private.id not in visible
+
+
+@pytest.mark.django_db
+def test_group_grants_follow_membership(user, friend, nested_folder):
+    course, week, notes = nested_folder
+    group = Group.objects.create(name="tutors")
+    assign_perm("drive.view_node", group, course)
+    assert not can_view(friend, notes)
+
+    friend.groups.add(group)
+    assert can_view(friend, notes)
+
+    # a direct grant outlives the group one
+    assign_perm("drive.view_node", friend, week)
+    friend.groups.remove(group)
+    assert not can_view(friend, course)
+    assert can_view(friend, notes)
+
+    remove_perm("drive.view_node", friend, week)
+    assert not can_view(friend, notes)
+
+
+@pytest.mark.django_db
+def test_removing_group_permission_revokes_access(user, friend, nested_folder):
+    course, week, notes = nested_folder
+    group = Group.objects.create(name="tutors")
+    group.user_set.add(friend)
+    assign_perm("drive.edit_node", group, week)
+    assert can_edit(friend, notes)
+
+    remove_perm("drive.edit_node", group, week)
+    assert not can_edit(friend, notes)
@@ -178,4 +178,94 @@ def test_owner_can_access_node_without_guardian_permission(root_folder):
     response = client.get(url)
 
     assert response.status_code == 200
-    assert response.json()["name"] == "Owner File"
\ No newline at end of file
+    assert response.json()["name"] == "Owner File"
+
+@pytest.mark.django_db
+def test_node_details_many_resolves_paths_in_bulk(root_folder, django_assert_max_num_queries):
+    from drive.serializers.node_serializers import NodeDetailsSerializer
+
+    owner = User.objects.create_user(
+        username="owner",
+        email="owner@test.com",
+        password="pass1234"
+    )
+    viewer = User.objects.create_user(
+        username="viewer",
+        email="viewer@test.com",
+        password="pass1234"
+    )
+
+    course = root_folder.add_child(
+        owner=owner,
+        name="course",
+        type=Node.NodeType.folder,
+        status=Node.NodeStatus.ACTIVE
+    )
+    week = course.add_child(
+        owner=owner,
+        name="week1",
+        type=Node.NodeType.folder,
+        status=Node.NodeStatus.ACTIVE
+    )
+    notes = week.add_child(
+        owner=owner,
+        name="notes.txt",
+        type=Node.NodeType.file,
+        status=Node.NodeStatus.ACTIVE
+    )
+    assign_perm("drive.view_node", viewer, week)
+
+    nodes = list(
+        Node.objects.filter(pk__in=[course.pk, week.pk, notes.pk])
+        .select_related("owner", "current_version")
+        .order_by("path")
+    )
+
+    with django_assert_max_num_queries(3):
+        data = NodeDetailsSerializer(nodes, many=True, context={"user": owner}).data
+
+    assert [item["path"] for item in data] == ["/", "/course", "/course/week1"]
+    assert data[0]["shared_with"] == []
+    assert data[1]["shared_with"] == [
+        {"user": {"username": "viewer", "email": "viewer@test.com"}, "perms": ["view_node"]}
+    ]
+
+    # without a requesting user no shares are exposed
+    anonymous_data = NodeDetailsSerializer(nodes, many=True).data
+    assert all(item["shared_with"] == [] for item in anonymous_data)
+
+
+@pytest.mark.django_db
+def test_node_details_many_checks_edit_access_in_one_query(user, root_folder, django_assert_max_num_queries):
+    from drive.serializers.node_serializers import NodeDetailsSerializer
+
+    editor = User.objects.create_user(
+        username="editor",
+        email="editor@test.com",
+        password="pass1234"
+    )
+    nodes = []
+    for i in range(4):
+        folder = root_folder.add_child(
+            owner=user,
+            name=f"course{i}",
+            type=Node.NodeType.folder,
+            status=Node.NodeStatus.ACTIVE
+        )
+        notes = folder.add_child(
+            owner=user,
+            name=f"notes{i}.txt",
+            type=Node.NodeType.file,
+            status=Node.NodeStatus.ACTIVE
+        )
+        nodes.append(notes)
+        if i % 2:
+            assign_perm("drive.edit_node", editor, notes)
+        else:
+            assign_perm("drive.view_node", editor, notes)
+
+    # one NodeAccess query for every ancestor chain, one for the shares
+    with django_assert_max_num_queries(2):
+        data = NodeDetailsSerializer(nodes, many=True, context={"user": editor}).data
+
+    assert [bool(item["shared_with"]) for item in data] == [False, True, False, True]
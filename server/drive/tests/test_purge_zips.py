@@ -0,0 +1,77 @@
+import pytest
+from datetime import timedelta
+from django.utils import timezone
+from drive.models import ZipFolder
+from drive.core import tasks
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeZipContainer:
+    def __init__(self, existing, failing=()):
+        self.existing = set(existing)
+        self.failing = set(failing)
+        self.batches = []
+
+    def delete_blobs(self, *names, raise_on_any_failure=True):
+        self.batches.append(names)
+        responses = []
+        for name in names:
+            if name in self.failing:
+                responses.append(FakeResponse(500))
+            elif name in self.existing:
+                self.existing.discard(name)
+                responses.append(FakeResponse(202))
+            else:
+                responses.append(FakeResponse(404))
+        return iter(responses)
+
+
+class FakeBlobService:
+    def __init__(self, container):
+        self.container = container
+
+    def get_container_client(self, name):
+        return self.container
+
+
+def create_zip(root_folder, key, expired, status=ZipFolder.ZipFolderStatus.COMPLETED):
+    zipfolder = ZipFolder.objects.create(node=root_folder, storage_key=key, size=100, status=status)
+    if expired:
+        ZipFolder.objects.filter(pk=zipfolder.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+    return zipfolder
+
+
+@pytest.mark.django_db
+def test_purge_deletes_expired_zips_in_batches(root_folder, monkeypatch):
+    expired = [create_zip(root_folder, f"zips/{i}.zip", expired=True) for i in range(5)]
+    fresh = create_zip(root_folder, "zips/fresh.zip", expired=False)
+    missing = create_zip(root_folder, "zips/missing.zip", expired=True, status=ZipFolder.ZipFolderStatus.FAILED)
+
+    container = FakeZipContainer([z.storage_key for z in expired] + [fresh.storage_key])
+    monkeypatch.setattr(tasks, "get_blob_service", lambda: FakeBlobService(container))
+
+    result = tasks.purge_expired_zips_task(batch_size=2)
+
+    assert result == {"deleted": 6, "reclaimed_bytes": 500}
+    assert [len(batch) for batch in container.batches] == [2, 2, 2]
+    assert container.existing == {fresh.storage_key}
+    assert set(ZipFolder.objects.filter(status=ZipFolder.ZipFolderStatus.DELETED).values_list("pk", flat=True)) == {
+        z.pk for z in expired + [missing]
+    }
+
+
+@pytest.mark.django_db
+def test_purge_keeps_rows_whose_blob_was_not_deleted(root_folder, monkeypatch):
+    zipfolder = create_zip(root_folder, "zips/stuck.zip", expired=True)
+    container = FakeZipContainer([zipfolder.storage_key], failing=[zipfolder.storage_key])
+    monkeypatch.setattr(tasks, "get_blob_service", lambda: FakeBlobService(container))
+
+    result = tasks.purge_expired_zips_task()
+
+    assert result == {"deleted": 0, "reclaimed_bytes": 0}
+    zipfolder.refresh_from_db()
+    assert zipfolder.status == ZipFolder.ZipFolderStatus.COMPLETED
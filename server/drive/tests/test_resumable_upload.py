@@ -0,0 +1,78 @@
+import hashlib
+import pytest
+import requests
+from django.urls import reverse
+from drive.models import Node, StorageUsage
+
+
+def put_block(block, content):
+    data = content[block["offset"]:block["offset"] + block["length"]]
+    response = requests.put(block["url"], data=data)
+    assert response.status_code == 201
+
+
+@pytest.mark.django_db
+def test_resumable_upload_resumes_missing_blocks(api_client, user, settings):
+    settings.DRIVE_RESUMABLE_BLOCK_SIZE = 1024
+    api_client.force_authenticate(user=user)
+
+    content = bytes(range(256)) * 20
+    init_response = api_client.post(reverse("init-upload"), {
+        "filename": "lecture.bin",
+        "size": len(content),
+        "mime_type": "application/octet-stream",
+        "checksum": hashlib.md5(content).hexdigest(),
+        "parent_id": None,
+    }, format="json")
+    assert init_response.status_code == 200
+    node_id = init_response.data["node_id"]
+    version_id = init_response.data["version_id"]
+    url = reverse("resumable-upload", kwargs={"node_id": node_id})
+
+    plan = api_client.post(url, {"version_id": version_id, "action": "plan"}, format="json")
+    assert plan.status_code == 200
+    assert plan.data["block_count"] == 5
+    assert plan.data["blocks"][-1]["length"] == len(content) - 4 * 1024
+
+    # the connection drops after two blocks
+    for block in plan.data["blocks"][:2]:
+        put_block(block, content)
+
+    early_commit = api_client.post(url, {"version_id": version_id, "action": "commit"}, format="json")
+    assert early_commit.status_code == 400
+
+    missing = api_client.get(url, {"version_id": version_id})
+    assert missing.status_code == 200
+    assert [block["index"] for block in missing.data["missing"]] == [2, 3, 4]
+
+    for block in reversed(missing.data["missing"]):
+        put_block(block, content)
+
+    commit = api_client.post(url, {"version_id": version_id, "action": "commit"}, format="json")
+    assert commit.status_code == 201
+    assert Node.objects.get(pk=node_id).status == Node.NodeStatus.ACTIVE
+    assert StorageUsage.objects.get(user=user).used_bytes == len(content)
+
+    # a retried commit, or one racing the BlobCreated worker, is not charged twice
+    retry = api_client.post(url, {"version_id": version_id, "action": "commit"}, format="json")
+    assert retry.status_code == 201
+    assert StorageUsage.objects.get(user=user).used_bytes == len(content)
+
+
+@pytest.mark.django_db
+def test_resumable_upload_is_owner_only(api_client, user, django_user_model):
+    api_client.force_authenticate(user=user)
+    init_response = api_client.post(reverse("init-upload"), {
+        "filename": "private.txt",
+        "size": 10,
+        "mime_type": "text/plain",
+        "checksum": hashlib.md5(b"0123456789").hexdigest(),
+        "parent_id": None,
+    }, format="json")
+
+    other = django_user_model.objects.create_user(username="mallory", password="StrongPass123!")
+    api_client.force_authenticate(user=other)
+    url = reverse("resumable-upload", kwargs={"node_id": init_response.data["node_id"]})
+    response = api_client.get(url, {"version_id": init_response.data["version_id"]})
+
+    assert response.status_code == 403
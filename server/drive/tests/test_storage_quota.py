@@ -0,0 +1,42 @@
+import pytest
+from django.urls import reverse
+from drive.models import StorageUsage
+from drive.utils.shortcuts import update_user_storage_usage
+
+
+@pytest.mark.django_db
+def test_storage_usage_is_created_and_updated_in_place(user):
+    update_user_storage_usage(user, 100)
+    update_user_storage_usage(user, 50)
+    assert StorageUsage.objects.get(user=user).used_bytes == 150
+
+    update_user_storage_usage(user, -500)
+    assert StorageUsage.objects.get(user=user).used_bytes == 0
+
+
+@pytest.mark.django_db
+def test_upload_over_quota_is_rejected(api_client, user, root_folder, settings):
+    settings.DRIVE_STORAGE_QUOTA_BYTES = 1000
+    update_user_storage_usage(user, 900)
+    api_client.force_authenticate(user=user)
+
+    payload = {
+        "filename": "big.bin",
+        "size": 200,
+        "mime_type": "application/octet-stream",
+        "checksum": "0" * 32,
+        "parent_id": root_folder.id,
+    }
+    response = api_client.post(reverse("init-upload"), payload, format="json")
+    assert response.status_code == 400
+
+    bulk_payload = {
+        "parent_id": root_folder.id,
+        "files": [
+            {"path": f"part{i}.bin", "size": 60, "mime_type": "application/octet-stream", "checksum": "0" * 32}
+            for i in range(2)
+        ],
+    }
+    response = api_client.post(reverse("bulk-init-upload"), bulk_payload, format="json")
+    assert response.status_code == 400
+    assert root_folder.get_children_count() == 0
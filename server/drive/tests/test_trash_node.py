@@ -0,0 +1,183 @@
+import pytest
+from datetime import timedelta
+from types import SimpleNamespace
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+from guardian.shortcuts import assign_perm
+from guardian.models import UserObjectPermission
+from drive.core import tasks
+from drive.models import Node, NodeVersion, StoredBlob, StorageUsage
+from drive.utils.shortcuts import update_user_storage_usage
+
+
+def add_node(user, parent, name, node_type=Node.NodeType.folder, status=Node.NodeStatus.ACTIVE):
+    return parent.add_child(name=name, owner=user, type=node_type, status=status)
+
+
+def add_file(user, parent, name, size, blob=None):
+    node = add_node(user, parent, name, Node.NodeType.file)
+    blob = blob or StoredBlob.objects.create(storage_key=f"u/{user.pk}/n/{node.pk}", checksum="0" * 32, size=size)
+    StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F("ref_count") + 1)
+    version = NodeVersion.objects.create(
+        node=node,
+        storage_key=blob.storage_key,
+        blob=blob,
+        size=size,
+        mime_type="text/plain",
+        checksum=blob.checksum,
+        status=NodeVersion.FileStatus.ACTIVE,
+    )
+    Node.objects.filter(pk=node.pk).update(current_version=version)
+    update_user_storage_usage(user, size)
+    return node
+
+
+class FakeFilesContainer:
+    def __init__(self, existing):
+        self.existing = set(existing)
+
+    def delete_blobs(self, *names, raise_on_any_failure=True):
+        responses = []
+        for name in names:
+            responses.append(SimpleNamespace(status_code=202 if name in self.existing else 404))
+            self.existing.discard(name)
+        return iter(responses)
+
+
+@pytest.fixture
+def course(user, root_folder):
+    """
+    root/
+    └── course/
+        ├── draft.txt    (UPLOADING)
+        ├── slides.pdf   (30 bytes)
+        └── week1/
+            └── notes.txt (10 bytes)
+    """
+    course = add_node(user, root_folder, "course")
+    week = add_node(user, course, "week1")
+    add_file(user, week, "notes.txt", 10)
+    add_file(user, course, "slides.pdf", 30)
+    add_node(user, course, "draft.txt", Node.NodeType.file, Node.NodeStatus.UPLOADING)
+    return course
+
+
+def used_bytes(user):
+    return StorageUsage.objects.get(user=user).used_bytes
+
+
+@pytest.mark.django_db
+def test_trash_and_restore_subtree(api_client, user, root_folder, course, django_assert_max_num_queries):
+    api_client.force_authenticate(user=user)
+
+    with django_assert_max_num_queries(12):
+        response = api_client.delete(reverse("node-detail", args=[course.id]))
+
+    assert response.status_code == 204
+    assert not Node.active_objects.filter(path__startswith=course.path).exists()
+    assert Node.objects.get(pk=course.pk).status == Node.NodeStatus.TRASHED
+    assert Node.objects.get(name="draft.txt").status == Node.NodeStatus.UPLOADING
+    assert used_bytes(user) == 0
+    assert [n["id"] for n in api_client.get(reverse("node-trash")).data["results"]] == [course.id]
+
+    response = api_client.post(reverse("node-restore", args=[course.id]))
+
+    assert response.status_code == 200
+    assert Node.active_objects.filter(path__startswith=course.path).count() == 4
+    assert not Node.objects.filter(deleted_at__isnull=False).exists()
+    assert used_bytes(user) == 40
+
+
+@pytest.mark.django_db
+def test_restore_keeps_earlier_trash(api_client, user, course):
+    week = Node.objects.get(name="week1")
+    api_client.force_authenticate(user=user)
+
+    api_client.delete(reverse("node-detail", args=[week.id]))
+    api_client.delete(reverse("node-detail", args=[course.id]))
+
+    # week1 was trashed on its own, its folder has to come back first
+    assert api_client.post(reverse("node-restore", args=[week.id])).status_code == 400
+    assert api_client.post(reverse("node-restore", args=[course.id])).status_code == 200
+
+    week.refresh_from_db()
+    assert week.status == Node.NodeStatus.TRASHED
+    assert Node.objects.get(name="notes.txt").deleted_at == week.deleted_at
+    assert used_bytes(user) == 30
+
+
+@pytest.mark.django_db
+def test_root_folder_and_strangers_cannot_trash(api_client, user, root_folder, course):
+    api_client.force_authenticate(user=user)
+    assert api_client.delete(reverse("node-detail", args=[root_folder.id])).status_code == 400
+
+    stranger = User.objects.create_user(username="bob", email="bob@test.com", password="StrongPass123!")
+    api_client.force_authenticate(user=stranger)
+    assert api_client.delete(reverse("node-detail", args=[course.id])).status_code == 403
+
+
+@pytest.mark.django_db
+def test_purge_deletes_expired_trash_and_orphan_blobs(api_client, user, root_folder, course, monkeypatch, settings):
+    settings.DRIVE_TRASH_RETENTION_DAYS = 30
+    friend = User.objects.create_user(username="friend", email="friend@test.com", password="StrongPass123!")
+    assign_perm("drive.view_node", friend, course)
+    slides = Node.objects.get(name="slides.pdf")
+    shared_blob = slides.current_version.blob
+    kept = add_file(user, root_folder, "slides-copy.pdf", 30, blob=shared_blob)
+    recent = add_node(user, root_folder, "recent")
+
+    api_client.force_authenticate(user=user)
+    api_client.delete(reverse("node-detail", args=[course.id]))
+    api_client.delete(reverse("node-detail", args=[recent.id]))
+    Node.objects.filter(path__startswith=course.path).update(deleted_at=timezone.now() - timedelta(days=31))
+    notes_key = Node.objects.get(name="notes.txt").current_version.storage_key
+
+    container = FakeFilesContainer([notes_key, shared_blob.storage_key])
+    monkeypatch.setattr(tasks, "get_blob_service", lambda: SimpleNamespace(get_container_client=lambda name: container))
+
+    result = tasks.purge_trash_task()
+
+    assert result == {"nodes": 5, "blobs": 1}
+    assert not Node.objects.filter(path__startswith=course.path).exists()
+    assert Node.objects.filter(pk=recent.pk).exists()
+    assert not UserObjectPermission.objects.filter(user=friend).exists()
+    assert container.existing == {shared_blob.storage_key}
+    assert not StoredBlob.objects.filter(storage_key=notes_key).exists()
+    assert StoredBlob.objects.get(pk=shared_blob.pk).ref_count == 1
+    kept.refresh_from_db()
+    assert kept.current_version.blob_id == shared_blob.pk
+    root_folder.refresh_from_db()
+    assert root_folder.numchild == 2
+    assert Node.find_problems() == ([], [], [], [], [])
+
+
+@pytest.mark.django_db
+def test_purge_deletes_large_subtrees_in_batches(api_client, user, root_folder, course, monkeypatch):
+    api_client.force_authenticate(user=user)
+    api_client.delete(reverse("node-detail", args=[course.id]))
+    Node.objects.filter(path__startswith=course.path).update(deleted_at=timezone.now() - timedelta(days=31))
+    monkeypatch.setattr(tasks, "get_blob_service", lambda: SimpleNamespace(get_container_client=lambda name: FakeFilesContainer([])))
+
+    result = tasks.purge_trash_task(batch_size=2)
+
+    assert result["nodes"] == 5
+    assert not NodeVersion.objects.exists()
+    root_folder.refresh_from_db()
+    assert root_folder.numchild == 0
+    assert Node.find_problems() == ([], [], [], [], [])
+
+
+@pytest.mark.django_db
+def test_restore_is_rejected_over_quota(api_client, user, course, settings):
+    settings.DRIVE_STORAGE_QUOTA_BYTES = 50
+    api_client.force_authenticate(user=user)
+    api_client.delete(reverse("node-detail", args=[course.id]))
+    update_user_storage_usage(user, 30)
+
+    response = api_client.post(reverse("node-restore", args=[course.id]))
+
+    assert response.status_code == 400
+    assert Node.objects.get(pk=course.pk).status == Node.NodeStatus.TRASHED
+    assert used_bytes(user) == 30
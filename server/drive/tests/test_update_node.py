@@ -122,4 +122,59 @@ def test_make_private_when_public(api_client, user, node):
     assert response.status_code == status.HTTP_200_OK
 
     node.refresh_from_db()
-    assert node.is_public is False
\ No newline at end of file
+    assert node.is_public is False
+
+def test_rename_folder_rewrites_descendant_display_paths(api_client, user, root_folder):
+    from drive.models import Node
+
+    course = root_folder.add_child(
+        name="course",
+        owner=user,
+        type=Node.NodeType.folder,
+        status=Node.NodeStatus.ACTIVE,
+    )
+    week = course.add_child(
+        name="week1",
+        owner=user,
+        type=Node.NodeType.folder,
+        status=Node.NodeStatus.ACTIVE,
+    )
+    notes = week.add_child(
+        name="notes.txt",
+        owner=user,
+        type=Node.NodeType.file,
+        status=Node.NodeStatus.ACTIVE,
+    )
+    assert notes.display_path == "/course/week1/notes.txt"
+
+    api_client.force_authenticate(user=user)
+
+    url = reverse("update-node", kwargs={"pk": course.id})
+    response = api_client.patch(url, {"name": "biology"}, format="json")
+
+    assert response.status_code == status.HTTP_200_OK
+
+    course.refresh_from_db()
+    week.refresh_from_db()
+    notes.refresh_from_db()
+    assert course.display_path == "/biology"
+    assert week.display_path == "/biology/week1"
+    assert notes.display_path == "/biology/week1/notes.txt"
+
+
+def test_rename_after_refresh_keeps_descendant_display_paths(user, root_folder):
+    from drive.models import Node
+
+    course = root_folder.add_child(name="course", owner=user, type=Node.NodeType.folder, status=Node.NodeStatus.ACTIVE)
+    week = course.add_child(name="a/b", owner=user, type=Node.NodeType.folder, status=Node.NodeStatus.ACTIVE)
+    week.add_child(name="notes.txt", owner=user, type=Node.NodeType.file, status=Node.NodeStatus.ACTIVE)
+
+    course.name = "biology"
+    course.save()
+    week.refresh_from_db()
+    week.name = "week1"
+    week.save()
+
+    assert week.display_path == "/biology/week1"
+    assert week.parent_display_path == "/biology"
+    assert Node.objects.get(name="notes.txt").display_path == "/biology/week1/notes.txt"
@@ -0,0 +1,108 @@
+import hashlib
+import pytest
+from datetime import timedelta
+from django.urls import reverse
+from django.utils import timezone
+from drive.models import Node, NodeVersion, StoredBlob, StorageUsage
+
+CONTENT = b"lecture-01.pdf bytes"
+CHECKSUM = hashlib.md5(CONTENT).hexdigest()
+
+
+@pytest.fixture
+def stored_blob():
+    return StoredBlob.objects.create(
+        storage_key="u/1/n/1/shared",
+        checksum=CHECKSUM,
+        size=len(CONTENT),
+        ref_count=1,
+        verified=True,
+    )
+
+
+def upload_intent(api_client, parent, checksum=CHECKSUM):
+    return api_client.post(
+        reverse("init-upload"),
+        {
+            "filename": "lecture-01.pdf",
+            "size": len(CONTENT),
+            "mime_type": "application/pdf",
+            "checksum": checksum,
+            "parent_id": parent.id,
+        },
+        format="json",
+    )
+
+
+@pytest.mark.django_db
+def test_known_content_is_not_uploaded_again(api_client, user, root_folder, stored_blob, settings):
+    settings.DRIVE_UPLOAD_DEDUP = True
+    api_client.force_authenticate(user=user)
+
+    response = upload_intent(api_client, root_folder)
+
+    assert response.status_code == 200
+    assert response.data["already_present"] is True
+    assert response.data["upload_url"] is None
+    node = Node.objects.get(pk=response.data["node_id"])
+    assert node.status == Node.NodeStatus.ACTIVE
+    assert node.current_version.storage_key == stored_blob.storage_key
+    stored_blob.refresh_from_db()
+    assert stored_blob.ref_count == 2
+    assert StorageUsage.objects.get(user=user).used_bytes == len(CONTENT)
+
+
+@pytest.mark.django_db
+def test_unverified_or_disabled_blobs_are_not_reused(api_client, user, root_folder, stored_blob, settings):
+    api_client.force_authenticate(user=user)
+
+    settings.DRIVE_UPLOAD_DEDUP = False
+    assert upload_intent(api_client, root_folder).data["already_present"] is False
+
+    settings.DRIVE_UPLOAD_DEDUP = True
+    StoredBlob.objects.filter(pk=stored_blob.pk).update(verified=False)
+    response = upload_intent(api_client, root_folder)
+
+    assert response.data["already_present"] is False
+    assert response.data["upload_url"].startswith("http")
+    version = NodeVersion.objects.get(pk=response.data["version_id"])
+    assert version.blob.storage_key == version.storage_key != stored_blob.storage_key
+
+
+@pytest.mark.django_db
+def test_blobs_open_to_upload_urls_are_not_reused(api_client, user, root_folder, stored_blob, settings):
+    settings.DRIVE_UPLOAD_DEDUP = True
+    StoredBlob.objects.filter(pk=stored_blob.pk).update(writable_until=timezone.now() + timedelta(minutes=10))
+    api_client.force_authenticate(user=user)
+
+    response = upload_intent(api_client, root_folder)
+
+    assert response.data["already_present"] is False
+    new_blob = NodeVersion.objects.get(pk=response.data["version_id"]).blob
+    assert new_blob.writable_until > timezone.now()
+
+    StoredBlob.objects.filter(pk=stored_blob.pk).update(writable_until=timezone.now() - timedelta(minutes=1))
+    assert upload_intent(api_client, root_folder).data["already_present"] is True
+
+
+@pytest.mark.django_db
+def test_bulk_intent_skips_known_content(api_client, user, root_folder, stored_blob, settings):
+    settings.DRIVE_UPLOAD_DEDUP = True
+    api_client.force_authenticate(user=user)
+    files = [
+        {"path": "week1/lecture-01.pdf", "size": len(CONTENT), "mime_type": "application/pdf", "checksum": CHECKSUM},
+        {"path": "week1/notes.txt", "size": 5, "mime_type": "text/plain", "checksum": "0" * 32},
+    ]
+
+    response = api_client.post(
+        reverse("bulk-init-upload"), {"parent_id": root_folder.id, "files": files}, format="json"
+    )
+
+    by_path = {f["path"]: f for f in response.data["files"]}
+    assert by_path["week1/lecture-01.pdf"]["already_present"] is True
+    assert by_path["week1/lecture-01.pdf"]["upload_url"] is None
+    assert by_path["week1/notes.txt"]["already_present"] is False
+    assert Node.objects.get(pk=by_path["week1/lecture-01.pdf"]["node_id"]).status == Node.NodeStatus.ACTIVE
+    stored_blob.refresh_from_db()
+    assert stored_blob.ref_count == 2
+    assert StorageUsage.objects.get(user=user).used_bytes == len(CONTENT)
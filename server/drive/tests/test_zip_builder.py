@@ -0,0 +1,131 @@
+import io
+import zipfile
+import pytest
+from drive.core.services.zip_builder import write_zip, get_compress_type, read_reusable_entries, ZipSource, iter_zip
+
+
+class FakeProperties:
+    def __init__(self, size):
+        self.size = size
+
+
+class FakeDownload:
+    def __init__(self, data):
+        self.data = data
+
+    def readall(self):
+        return self.data
+
+    def chunks(self):
+        for i in range(0, len(self.data), 1024):
+            yield self.data[i:i + 1024]
+
+
+class FakeBlobClient:
+    def __init__(self, data):
+        self.data = data
+
+    def get_blob_properties(self):
+        return FakeProperties(len(self.data))
+
+    def download_blob(self, offset=0, length=None):
+        end = len(self.data) if length is None else offset + length
+        return FakeDownload(self.data[offset:end])
+
+
+class FakeContainer:
+    def __init__(self, blobs):
+        self.blobs = blobs
+
+    def get_blob_client(self, storage_key):
+        return FakeBlobClient(self.blobs[storage_key])
+
+
+class UnseekableSink(io.RawIOBase):
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+    def tell(self):
+        return len(self.data)
+
+    def seekable(self):
+        return False
+
+
+@pytest.mark.parametrize("mime_type, expected", [
+    ("image/jpeg", zipfile.ZIP_STORED),
+    ("video/mp4", zipfile.ZIP_STORED),
+    ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", zipfile.ZIP_STORED),
+    ("text/plain", zipfile.ZIP_DEFLATED),
+    ("application/pdf", zipfile.ZIP_DEFLATED),
+    (None, zipfile.ZIP_DEFLATED),
+])
+def test_compress_type_follows_mime_type(mime_type, expected):
+    assert get_compress_type(mime_type) == expected
+
+
+@pytest.mark.parametrize("max_buffer_bytes", [1, 10 * 1024, 1024 * 1024])
+def test_write_zip_keeps_order_and_content(max_buffer_bytes):
+    blobs = {
+        f"key-{i}": (f"content {i} ".encode() * (i * 300 + 1))
+        for i in range(12)
+    }
+    sources = [
+        (key, f"folder/{key}.{'jpg' if i % 2 else 'txt'}", "image/jpeg" if i % 2 else "text/plain", len(data))
+        for i, (key, data) in enumerate(blobs.items())
+    ]
+
+    sink = UnseekableSink()
+    write_zip(sink, FakeContainer(blobs), sources, max_workers=3, max_buffer_bytes=max_buffer_bytes)
+
+    archive = zipfile.ZipFile(io.BytesIO(bytes(sink.data)))
+    assert archive.namelist() == [arcname for _, arcname, _, _ in sources]
+    for key, arcname, mime_type, _ in sources:
+        assert archive.read(arcname) == blobs[key]
+        assert archive.getinfo(arcname).compress_type == get_compress_type(mime_type)
+
+
+def test_write_zip_copies_unchanged_entries_from_previous_archive():
+    blobs = {f"key-{i}": f"content {i} ".encode() * 500 for i in range(6)}
+    sources = [
+        (f"key-{i}", f"week{i % 2}/file{i}.{'jpg' if i % 3 else 'txt'}", "image/jpeg" if i % 3 else "text/plain", len(blobs[f"key-{i}"]))
+        for i in range(6)
+    ]
+    previous = UnseekableSink()
+    write_zip(previous, FakeContainer(blobs), sources)
+    manifest = {arcname: key for key, arcname, _, _ in sources}
+
+    # file2 got a new version, file6 is new; the rest must come from the old archive
+    changed = {"key-2b": b"updated content" * 40, "key-6": b"brand new"}
+    new_sources = [source for source in sources if source[0] != "key-2"]
+    new_sources.insert(2, ("key-2b", "week0/file2.jpg", "image/jpeg", len(changed["key-2b"])))
+    new_sources.append(("key-6", "week0/file6.txt", "text/plain", len(changed["key-6"])))
+
+    base_blob_client = FakeBlobClient(bytes(previous.data))
+    reusable = read_reusable_entries(base_blob_client, manifest, [ZipSource(*source) for source in new_sources])
+    assert set(reusable) == {arcname for key, arcname, _, _ in new_sources if key in blobs}
+
+    sink = UnseekableSink()
+    write_zip(sink, FakeContainer(changed), new_sources, base_blob_client=base_blob_client, reusable=reusable)
+
+    archive = zipfile.ZipFile(io.BytesIO(bytes(sink.data)))
+    assert archive.testzip() is None
+    assert archive.namelist() == [arcname for _, arcname, _, _ in new_sources]
+    for key, arcname, _, _ in new_sources:
+        assert archive.read(arcname) == {**blobs, **changed}[key]
+
+
+def test_iter_zip_streams_a_valid_archive():
+    blobs = {f"key-{i}": f"streamed {i} ".encode() * 2000 for i in range(4)}
+    sources = [(key, f"{key}.txt", "text/plain", len(data)) for key, data in blobs.items()]
+
+    chunks = list(iter_zip(FakeContainer(blobs), sources, max_workers=2))
+
+    assert len(chunks) > 1
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    for key, arcname, _, _ in sources:
+        assert archive.read(arcname) == blobs[key]
@@ -2,10 +2,16 @@ from django.urls import path, include
 from drive.api.v1.nodes import (
     NodeViewSet,
     InitFileUpload,
+    BulkInitFileUpload,
     FinalizeFileUpload,
+    BulkFinalizeFileUpload,
+    BlobEventsWebhook,
+    ResumableUploadView,
     SearchUserNode,
     UpdateNode,
-    DownloadNodeView
+    DownloadNodeView,
+    StreamNodeZipView,
+    TaskResultView
 )
 from drive.api.v1.node_version import NodeVersionsListView
 from rest_framework.routers import DefaultRouter
@@ -16,9 +22,15 @@ router.register(r'nodes', NodeViewSet, basename='node')
 urlpatterns = [
     path('api/', include(router.urls)),
     path("api/nodes/files/upload-intent", InitFileUpload.as_view(), name="init-upload"),
+    path("api/nodes/files/upload-intent/bulk", BulkInitFileUpload.as_view(), name="bulk-init-upload"),
     path("api/nodes/files/<int:node_id>/finalize", FinalizeFileUpload.as_view(), name="finalize-upload"),
+    path("api/nodes/files/<int:node_id>/blocks", ResumableUploadView.as_view(), name="resumable-upload"),
+    path("api/nodes/files/finalize/bulk", BulkFinalizeFileUpload.as_view(), name="bulk-finalize-upload"),
+    path("api/nodes/files/events", BlobEventsWebhook.as_view(), name="blob-events"),
     path("api/nodes/search/", SearchUserNode.as_view(), name="node-search"),
     path("nodes/<int:pk>/", UpdateNode.as_view(), name="update-node"),
     path("nodes/files/<int:node_id>/versions", NodeVersionsListView.as_view(), name="node-versions"),
     path("nodes/<int:node_id>/download", DownloadNodeView.as_view(), name="download-node"),
+    path("nodes/<int:node_id>/download/stream", StreamNodeZipView.as_view(), name="stream-node-zip"),
+    path("nodes/tasks/<str:task_id>/", TaskResultView.as_view(), name="task-status"),
 ]
\ No newline at end of file
@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class NodeCursorPagination(CursorPagination):
+    """
+    Keyset pagination over a folder's children.
+    Pages follow the unique treebeard path, i.e. sibling insertion position:
+    new children are placed at their name position, but a rename does not
+    re-sort, so this is not strict name order. Paging by path keeps pages
+    stable and costs the same no matter how far the client has scrolled.
+    """
+    ordering = "path"
+    page_size_query_param = "page_size"
+    max_page_size = 200
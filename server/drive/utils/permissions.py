@@ -1,8 +1,160 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from rest_framework.permissions import BasePermission
-from guardian.shortcuts import get_objects_for_user
 from django.contrib.auth.models import User
-from drive.models import Node
-from django.db.models import Q
+from django.contrib.contenttypes.models import ContentType
+from guardian.models import UserObjectPermission, GroupObjectPermission
+from drive.models import Node, NodeAccess
+from django.db.models import Q, F, Exists, OuterRef, Func, BooleanField
+
+VIEW_LEVELS = (NodeAccess.AccessLevel.VIEWER, NodeAccess.AccessLevel.EDITOR)
+EDIT_LEVELS = (NodeAccess.AccessLevel.EDITOR,)
+
+PERM_ACCESS_LEVELS = {
+    "view_node": NodeAccess.AccessLevel.VIEWER,
+    "edit_node": NodeAccess.AccessLevel.EDITOR,
+}
+
+
+def get_ancestor_paths(node: Node) -> list[str]:
+    """
+    Materialized paths of the node and all of its ancestors, computed from
+    the node's own path without touching the database.
+    """
+    steplen = node.steplen
+    return [node.path[:i] for i in range(steplen, len(node.path) + 1, steplen)]
+
+
+class NodePermissionResolver:
+    """
+    Answers access checks for one user from memory, loading the user's
+    NodeAccess grants for each ancestor chain only the first time it is seen.
+    """
+
+    def __init__(self, user: User):
+        self.user = user
+        self._levels_by_path: dict[str, set[str]] = {}
+
+    def _load(self, paths: list[str]):
+        missing = [p for p in paths if p not in self._levels_by_path]
+        if not missing:
+            return
+        for path in missing:
+            self._levels_by_path[path] = set()
+        grants = NodeAccess.objects.filter(
+            user=self.user,
+            node__path__in=missing
+        ).values_list("node__path", "level")
+        for path, level in grants:
+            self._levels_by_path[path].add(level)
+
+    def prefetch(self, nodes):
+        """
+        Loads the grants over the ancestor chains of all ``nodes`` in one query.
+        """
+        if not self.user.is_authenticated or self.user.is_superuser:
+            return
+        self._load(list({
+            path
+            for node in nodes if node.owner_id != self.user.pk
+            for path in get_ancestor_paths(node)
+        }))
+
+    def has_access(self, node: Node, levels) -> bool:
+        if not self.user.is_authenticated:
+            return False
+        if node.owner_id == self.user.pk or self.user.is_superuser:
+            return True
+        paths = get_ancestor_paths(node)
+        self._load(paths)
+        return any(self._levels_by_path[p].intersection(levels) for p in paths)
+
+    def invalidate(self):
+        self._levels_by_path.clear()
+
+
+_request_resolvers: ContextVar[dict | None] = ContextVar("drive_permission_resolvers", default=None)
+
+
+@contextmanager
+def permission_cache():
+    """
+    Shares one NodePermissionResolver per user for everything run inside the block.
+    """
+    token = _request_resolvers.set({})
+    try:
+        yield
+    finally:
+        _request_resolvers.reset(token)
+
+
+def get_permission_resolver(user: User) -> NodePermissionResolver:
+    resolvers = _request_resolvers.get()
+    if resolvers is None:
+        return NodePermissionResolver(user)
+    resolver = resolvers.get(user.pk)
+    if resolver is None:
+        resolver = resolvers[user.pk] = NodePermissionResolver(user)
+    return resolver
+
+
+def invalidate_permission_cache(user_ids):
+    resolvers = _request_resolvers.get() or {}
+    for user_id in user_ids:
+        if resolver := resolvers.get(user_id):
+            resolver.invalidate()
+
+
+def has_node_access(user: User, node: Node, levels) -> bool:
+    return get_permission_resolver(user).has_access(node, levels)
+
+
+def grant_node_access(node: Node, users, level):
+    users = list(users)
+    NodeAccess.objects.bulk_create(
+        [NodeAccess(node=node, user=user, level=level) for user in users],
+        ignore_conflicts=True
+    )
+    invalidate_permission_cache(user.pk for user in users)
+
+
+def sync_node_access(node_ids, user_ids):
+    """
+    Rebuilds the NodeAccess rows of ``user_ids`` on ``node_ids`` from their
+    guardian grants, given to the user directly or to one of their groups.
+    """
+    node_ids, user_ids = set(node_ids), set(user_ids)
+    if not node_ids or not user_ids:
+        return
+    grants = {
+        "content_type": ContentType.objects.get_for_model(Node),
+        "object_pk__in": [str(pk) for pk in node_ids],
+        "permission__codename__in": list(PERM_ACCESS_LEVELS),
+    }
+    granted = {
+        (int(object_pk), user_id, PERM_ACCESS_LEVELS[codename])
+        for user_id, object_pk, codename in [
+            *UserObjectPermission.objects.filter(user_id__in=user_ids, **grants).values_list(
+                "user_id", "object_pk", "permission__codename"
+            ),
+            *GroupObjectPermission.objects.filter(group__user__in=user_ids, **grants).values_list(
+                "group__user", "object_pk", "permission__codename"
+            ),
+        ]
+    }
+    indexed = set(
+        NodeAccess.objects.filter(node_id__in=node_ids, user_id__in=user_ids).values_list("node_id", "user_id", "level")
+    )
+    stale = Q(pk__in=[])
+    for node_id, user_id, level in indexed - granted:
+        stale |= Q(node_id=node_id, user_id=user_id, level=level)
+    NodeAccess.objects.filter(stale).delete()
+    NodeAccess.objects.bulk_create(
+        [NodeAccess(node_id=node_id, user_id=user_id, level=level) for node_id, user_id, level in granted - indexed],
+        ignore_conflicts=True
+    )
+    invalidate_permission_cache(user_ids)
+
 
 class IsEditor(BasePermission):
     """
@@ -11,20 +163,7 @@ class IsEditor(BasePermission):
     """
 
     def has_object_permission(self, request, view, obj):
-        user = request.user
-        
-        if obj.owner == user:
-            return True
-        
-        if user.has_perm("drive.edit_node", obj):
-            return True
-        
-        ancestors_qs = obj.get_ancestors()
-        return get_objects_for_user(
-            user, 
-            "drive.edit_node", 
-            klass=ancestors_qs
-        ).exists()
+        return can_edit(request.user, obj)
 
 class IsViewer(BasePermission):
     """
@@ -32,50 +171,44 @@ class IsViewer(BasePermission):
     perms on the node or ancestors.
     """
     def has_object_permission(self, request, view, obj):
-        user = request.user
-        if obj.owner == user:
-            return True
-            
-        if user.has_perm("drive.view_node", obj):
-            return True
-            
-        ancestors_qs = obj.get_ancestors()
-        return get_objects_for_user(
-            user, 
-            "drive.view_node", 
-            klass=ancestors_qs
-        ).exists()
+        return can_view(request.user, obj)
     
 
+def filter_editable(user: User, nodes) -> list[Node]:
+    """
+    The nodes among ``nodes`` the user can edit, checked with a single
+    NodeAccess query however many folders they come from.
+    """
+    resolver = get_permission_resolver(user)
+    resolver.prefetch(nodes)
+    return [node for node in nodes if resolver.has_access(node, EDIT_LEVELS)]
+
 def can_edit(user: User, node: Node):
-    if node.owner == user:
-        return True
-    
-    if user.has_perm("fileSharing.edit_node", node):
-        return True
-    
-    ancestors_qs = node.get_ancestors()
-    permitted_nodes = get_objects_for_user(
-        user, 
-        "fileSharing.edit_node", 
-        klass=ancestors_qs
-    )
-    return permitted_nodes.exists()
+    return has_node_access(user, node, EDIT_LEVELS)
 
 def can_view(user: User, node: Node):
-    if node.owner == user:
-        return True
-    
-    if user.has_perm("fileSharing.view_node", node):
-        return True
-    
-    ancestors_qs = node.get_ancestors()
-    permitted_nodes = get_objects_for_user(
-        user, 
-        "fileSharing.view_node", 
-        klass=ancestors_qs
-    )
-    return permitted_nodes.exists()
+    return has_node_access(user, node, VIEW_LEVELS)
+
+
+class IsAncestorPath(Func):
+    """
+    ``ancestor = ANY(ARRAY[...])`` where the array holds the materialized paths
+    of ``path`` and all of its ancestors. The array is derived from ``path``
+    itself, so the match is answered by probing the path index once per depth.
+    """
+    arity = 2
+    output_field = BooleanField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        ancestor, path = self.get_source_expressions()
+        ancestor_sql, ancestor_params = compiler.compile(ancestor)
+        path_sql, path_params = compiler.compile(path)
+        steplen = Node.steplen
+        sql = (
+            f"{ancestor_sql} = ANY(ARRAY(SELECT left({path_sql}, step) "
+            f"FROM generate_series({steplen}, length({path_sql}), {steplen}) AS step))"
+        )
+        return sql, (*ancestor_params, *path_params, *path_params)
 
 
 def get_accessible_path_filter(user):
@@ -87,18 +220,9 @@ def get_accessible_path_filter(user):
 
     if user.is_superuser:
         return Q()
-    
-    permitted_nodes = get_objects_for_user(
-        user, ["view_node", "edit_node"], klass=Node, any_perm=True
-    ).values_list("path", flat=True)
-
-    permission_query = Q(owner=user) | Q(is_public=True)
 
-    if permitted_nodes:
-        path_q = Q()
-        for p in permitted_nodes:
-            path_q |= Q(path__startswith=p)
-
-        permission_query |= path_q
-
-    return permission_query
\ No newline at end of file
+    shared_with_user = NodeAccess.objects.filter(
+        IsAncestorPath(F("node__path"), OuterRef("path")),
+        user=user
+    )
+    return Q(owner=user) | Q(is_public=True) | Q(Exists(shared_with_user))
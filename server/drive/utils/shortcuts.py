@@ -1,6 +1,10 @@
 from django.contrib.auth.models import User
 from ..models import Node, StorageUsage
 from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.core.exceptions import BadRequest
+from django.conf import settings
 
 def get_or_create_root_folder(user:User) -> Node:
     if root := Node.active_objects.filter(owner=user, name=f"{user.pk}Home").first():
@@ -16,8 +20,27 @@ def get_or_create_root_folder(user:User) -> Node:
     return root
 
 
-def update_user_storage_usage(user:User, size:int):
-    usage, _ = StorageUsage.objects.get_or_create(user=user)
-    usage.used_bytes += size
-    usage.save()
-    return
\ No newline at end of file
+def update_user_storage_usage(user:User | int, size:int):
+    """
+    Adds ``size`` (negative to release space) to the user's usage in a single
+    UPDATE, so parallel finalizes never lose each other's bytes.
+    ``user`` may also be a user id.
+    """
+    user_id = getattr(user, "pk", user)
+    used_bytes = Greatest(F("used_bytes") + size, Value(0))
+    if not StorageUsage.objects.filter(user_id=user_id).update(used_bytes=used_bytes):
+        StorageUsage.objects.bulk_create([StorageUsage(user_id=user_id)], ignore_conflicts=True)
+        StorageUsage.objects.filter(user_id=user_id).update(used_bytes=used_bytes)
+
+
+def check_storage_quota(user:User, incoming_bytes:int):
+    """
+    Rejects an upload that would take the user over quota. A plain read
+    without locks: the quota is a guard rail, not an exact reservation.
+    """
+    quota = settings.DRIVE_STORAGE_QUOTA_BYTES
+    if not quota:
+        return
+    used_bytes = StorageUsage.objects.filter(user=user).values_list("used_bytes", flat=True).first() or 0
+    if used_bytes + incoming_bytes > quota:
+        raise BadRequest("storage quota exceeded")